@@ -1,9 +1,11 @@
 import time
 import matplotlib.pyplot as plt
 from render import *
+from writer import *
+from scene import *
 
 # load data
-data = np.load('h1.npy', allow_pickle=True)[()]
+data = open_scene('h1.npy')
 
 verts2d = data['verts2d']
 vcolors = data['vcolors']
@@ -17,4 +19,4 @@ print(time.time() - start_time)
 
 plt.imshow(img)
 plt.show()
-plt.imsave("flat_fish.png", img)
+write_image("flat_fish.png", img)
@@ -1,9 +1,11 @@
 import time
 import matplotlib.pyplot as plt
 from render import *
+from writer import *
+from scene import *
 
 # load data
-data = np.load('h1.npy', allow_pickle=True)[()]
+data = open_scene('h1.npy')
 
 verts2d = data['verts2d']
 vcolors = data['vcolors']
@@ -18,4 +20,4 @@ print(time.time() - start_time)
 img = np.clip(img, 0, 1)
 plt.imshow(img)
 plt.show()
-plt.imsave("gouraud_fish.png", img)
+write_image("gouraud_fish.png", img)
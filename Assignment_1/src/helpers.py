@@ -1,17 +1,6 @@
 import numpy as np
 
 
-# define the Edge object
-class Edge:
-    def __init__(self, vertices, vcolors, edge_slope, is_active):
-        self.vertices = vertices
-        self.vcolors = vcolors
-        self.edge_slope = edge_slope
-        self.is_active = is_active
-        self.y_min = min(vertices[0, 1], vertices[1, 1])
-        self.y_max = max(vertices[0, 1], vertices[1, 1])
-
-
 def interpolate_vectors(p1, p2, V1, V2, xy, dim):
     # calculates the value V of a vector in coordinates p = (x,y) by interpolating
     # two vectors with values V1 and V2 with respective coordinates p1 = (x1,y1) and p2 = (x2,y2)
@@ -35,61 +24,449 @@ def interpolate_vectors(p1, p2, V1, V2, xy, dim):
     return V
 
 
-def slope(a, b):
-    # calculates the slope of the line connecting the two points
+# the edges of a triangle as pairs of its vertices: AB, BC and CA
+EDGES = np.array([[0, 1], [1, 2], [2, 0]])
 
-    np.seterr(divide='ignore')
-    if a[0] == b[0]:
-        return np.inf
-    else:
-        return (b[1] - a[1]) / (b[0] - a[0])
+# packed record with the setup of a triangle for the scanline filling functions (see triangle_setup)
+SETUP_TYPE = np.dtype([("distinct", np.int8), ("fill", np.bool_), ("horizontal", np.bool_),
+                       ("y_min", np.int64), ("y_max", np.int64), ("x_start", np.int64, (2,)),
+                       ("start_vertex", np.int8, (2,)), ("active", np.int8, (3,)), ("switch_y", np.int64, (2,)),
+                       ("inv_slope", np.float64, (3,))])
 
 
-def initialize_variables(edges, active_edges):
-    # finds the initial values (when y = y_min) for the points of the vertices of the horizontal line, as
-    # well as their colors
-    # - edges: list of the edges of the triangle
-    # - active_edges: list of the active edges of the triangle in that particular scanline
+def triangle_setup(vertices):
+    # prepares the scanning of many triangles at once, with whole array operations, into one packed record per
+    # triangle; the filling functions then walk the edges from the record instead of building edge objects
+    # - vertices: Tx3x2 array with the 2D (integer) coordinates of the vertices of T triangles
+    # - setup: vector of T records of type SETUP_TYPE with the fields
+    #   distinct: number of distinct vertices (1, 2 or 3)
+    #   fill: False if the triangle cannot be scanned (fewer than 3 distinct vertices or all of them on one row)
+    #   horizontal: True if the lowest edge is horizontal
+    #   y_min, y_max: the lowest and the highest row of the triangle
+    #   x_start: the x of the two active edges on row y_min
+    #   start_vertex: the vertices the two active edges start from
+    #   active: the edges (indices in EDGES) that are active on row y_min, then the edge that replaces the one of
+    #   them that ends first
+    #   switch_y: the row after which each of the two active edges is replaced by the third edge
+    #   inv_slope: the change of x per row along each edge (0 for vertical or horizontal edges)
 
-    if edges[active_edges[0]].vertices[0, 1] == edges[active_edges[0]].y_max:
-        x1 = edges[active_edges[0]].vertices[1, 0]
-        y1 = edges[active_edges[0]].vertices[1, 1]
-        color1 = edges[active_edges[0]].vcolors[1, :]
-    else:
-        x1 = edges[active_edges[0]].vertices[0, 0]
-        y1 = edges[active_edges[0]].vertices[0, 1]
-        color1 = edges[active_edges[0]].vcolors[0, :]
-
-    if edges[active_edges[1]].vertices[0, 1] == edges[active_edges[1]].y_max:
-        x2 = edges[active_edges[1]].vertices[1, 0]
-        y2 = edges[active_edges[1]].vertices[1, 1]
-        color2 = edges[active_edges[1]].vcolors[1, :]
+    vertices = np.asarray(vertices)
+    x, y = vertices[:, :, 0], vertices[:, :, 1]
+    p, q = EDGES[:, 0], EDGES[:, 1]
+    setup = np.zeros(len(vertices), dtype=SETUP_TYPE)
+
+    # distinct vertices from the edges whose two ends coincide
+    same = np.all(vertices[:, p] == vertices[:, q], axis=2)
+    setup["distinct"] = np.where(np.all(same, axis=1), 1, np.where(np.any(same, axis=1), 2, 3))
+
+    # slope of every edge; vertical edges have infinite slope and horizontal ones zero slope
+    dx, dy = x[:, q] - x[:, p], y[:, q] - y[:, p]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slopes = np.where(dx == 0, np.inf, dy / dx)
+        setup["inv_slope"] = np.where(np.isfinite(slopes) & (slopes != 0), 1 / slopes, 0)
+
+    edge_y_min, edge_y_max = np.minimum(y[:, p], y[:, q]), np.maximum(y[:, p], y[:, q])
+    setup["y_min"], setup["y_max"] = y.min(axis=1), y.max(axis=1)
+
+    # the edges starting from the lowest row are active, unless they are horizontal
+    lowest = edge_y_min == setup["y_min"][:, np.newaxis]
+    active = lowest & (slopes != 0)
+    setup["horizontal"] = np.any(lowest & (slopes == 0), axis=1)
+    setup["fill"] = (np.count_nonzero(active, axis=1) >= 2) & (setup["distinct"] == 3)
+
+    first, second = np.argmax(active, axis=1), 2 - np.argmax(active[:, ::-1], axis=1)
+    setup["active"] = np.column_stack((first, second, 3 - first - second))
+    rows = np.arange(len(vertices))
+    setup["switch_y"] = np.column_stack((edge_y_max[rows, first], edge_y_max[rows, second]))
+
+    # the active edges start from their lower vertex, which is a single vertex unless the lowest edge is horizontal
+    lower = np.where(y[:, p] == edge_y_max, q, p)
+    lowest_vertex = 2 - np.argmax((y == setup["y_min"][:, np.newaxis])[:, ::-1], axis=1)
+    start = np.where(setup["horizontal"][:, np.newaxis], np.column_stack((lower[rows, first], lower[rows, second])),
+                     lowest_vertex[:, np.newaxis])
+    setup["start_vertex"] = start
+    setup["x_start"] = x[rows[:, np.newaxis], start]
+
+    return setup
+
+
+def scan_edges(setup, y_last):
+    # walks the two active edges of a triangle up from its lowest row, adding the change of x per row of the edge
+    # each one is on at every row
+    # - setup: the record of the triangle (see triangle_setup)
+    # - y_last: the last row to walk to (at most y_max)
+    # - ys: the rows y_min + 1 .. y_last
+    # - xs: Rx2 matrix with the x of the two edges on each row
+    # - edges: Rx2 matrix with the edges (indices in EDGES) the two are on at each row
+
+    ys = np.arange(setup["y_min"] + 1, y_last + 1)
+    edges = np.where(ys[:, np.newaxis] <= setup["switch_y"], setup["active"][:2], setup["active"][2])
+    steps = setup["inv_slope"][edges]
+
+    # a running sum, so that every row adds its step to the x of the previous row
+    xs = np.cumsum(np.vstack((setup["x_start"], steps)), axis=0)[1:]
+
+    return ys, xs, edges
+
+
+def scan_spans(setup, budget=1 << 22):
+    # walks the edges of many triangles at once, as scan_edges does for each of them, and gives the span of every
+    # row above their lowest one; the triangles are walked in groups of similar height, padded to the tallest of the
+    # group, so that a group holds at most about budget rows
+    # - setup: vector of records of type SETUP_TYPE (see triangle_setup); only the ones to fill are walked
+    # - budget: the number of (padded) rows walked at once
+    # - triangles, ys, lo, hi: vectors with the triangle (index in setup), the row and the first and the last x of
+    # each span, as the scanline filling functions compute them
+
+    fill = np.flatnonzero(setup["fill"])
+    heights = setup["y_max"][fill] - setup["y_min"][fill]
+    order = np.argsort(heights, kind="stable")
+    fill, heights = fill[order], heights[order]
+
+    spans = []
+    start = 0
+    while start < len(fill):
+        # the heights are sorted, so the padded size of a group grows with every triangle added to it
+        size = np.arange(1, len(fill) - start + 1) * (heights[start:] + 1)
+        stop = start + max(np.searchsorted(size, budget, side="right"), 1)
+        group, R = setup[fill[start:stop]], heights[stop - 1]
+
+        ys = group["y_min"][:, np.newaxis] + np.arange(1, R + 1)
+        edges = np.where(ys[:, :, np.newaxis] <= group["switch_y"][:, np.newaxis, :],
+                         group["active"][:, np.newaxis, :2], group["active"][:, np.newaxis, 2:])
+        steps = np.take_along_axis(group["inv_slope"][:, np.newaxis, :], edges, axis=2)
+
+        # the same running sum as scan_edges, along the rows of every triangle
+        xs = np.cumsum(np.concatenate((group["x_start"][:, np.newaxis, :], steps), axis=1), axis=1)[:, 1:]
+
+        valid = np.arange(1, R + 1) <= heights[start:stop, np.newaxis]
+        triangles = np.broadcast_to(fill[start:stop, np.newaxis], ys.shape)
+        spans.append((triangles[valid], ys[valid], np.trunc(xs.min(axis=2)[valid]).astype(np.int64),
+                      np.trunc(xs.max(axis=2)[valid]).astype(np.int64)))
+        start = stop
+
+    if not spans:
+        return tuple(np.zeros(0, dtype=np.int64) for _ in range(4))
+
+    return tuple(np.concatenate(field) for field in zip(*spans))
+
+
+def expand_spans(lo, hi):
+    # lists the pixels of many spans at once
+    # - lo, hi: vectors with the first and the last x of each span (spans with hi < lo are empty)
+    # - spans: the index of the span of each pixel
+    # - xs: the x of each pixel
+
+    counts = np.maximum(hi - lo + 1, 0)
+    spans = np.repeat(np.arange(len(lo)), counts)
+    offsets = np.cumsum(counts) - counts
+
+    return spans, lo[spans] + (np.arange(len(spans)) - offsets[spans])
+
+
+def edge_values(vertices, values, edges, ys):
+    # interpolates values of the vertices of a triangle along its edges, on every row
+    # - vertices: 3x2 matrix containing in each row the 2D coordinates of one of the triangle's vertices
+    # - values: 3xC matrix with the values (e.g. colors) of the vertices
+    # - edges: Rx2 matrix with two edges (indices in EDGES) for each row, as given by scan_edges
+    # - ys: the R rows
+    # - V: Rx2xC array with the values on the two edges of each row
+
+    p, q = EDGES[edges, 0], EDGES[edges, 1]
+    t = (ys[:, np.newaxis] - vertices[p, 1]) / (vertices[q, 1] - vertices[p, 1])
+    values = np.asarray(values)
+
+    return values[p] + t[:, :, np.newaxis] * (values[q] - values[p])
+
+
+def edge_coverage(vertices, M, N):
+    # evaluates the three edge functions of a triangle over its bounding box (clipped to the MxN canvas) as whole
+    # arrays and returns the covered pixels together with their barycentric weights
+    # - vertices: 3x2 matrix containing in each row the 2D coordinates of one of the triangle's vertices
+    # - M, N: height and width of the canvas
+    # - ys, xs: 1D arrays with the coordinates of the covered pixels
+    # - weights: Px3 matrix with the barycentric weight of each vertex for each one of the P covered pixels
+    # a pixel x of a row y is covered when x <= x_right(y) and x + 1 > x_left(y), which is the span
+    # int(x_left)..int(x_right) that the scanline filling functions fill
+
+    vertices = np.asarray(vertices, dtype=float)
+
+    # signed double area of the triangle; zero means that it cannot be filled
+    a, b, c = vertices
+    area = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+    if area == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty((0, 3))
+
+    # bounding box of the triangle clipped to the canvas
+    x_min = max(int(np.floor(vertices[:, 0].min())), 0)
+    x_max = min(int(np.floor(vertices[:, 0].max())), N - 1)
+    y_min = max(int(np.ceil(vertices[:, 1].min())), 0)
+    y_max = min(int(np.floor(vertices[:, 1].max())), M - 1)
+    if x_min > x_max or y_min > y_max:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty((0, 3))
+
+    x = np.arange(x_min, x_max + 1, dtype=float)[np.newaxis, :]
+    y = np.arange(y_min, y_max + 1, dtype=float)[:, np.newaxis]
+
+    sign = np.sign(area)
+    inside = np.ones((y.shape[0], x.shape[1]), dtype=bool)
+    weights = []
+
+    for i in range(3):
+        # edge opposite to the i-th vertex, oriented so that the inner side of the triangle is positive
+        p, q = vertices[(i + 1) % 3], vertices[(i + 2) % 3]
+        step = -sign * (q[1] - p[1])
+        w = sign * ((q[0] - p[0]) * (y - p[1]) - (q[1] - p[1]) * (x - p[0]))
+
+        if step > 0:
+            # left edge: the pixel is covered if the edge passes before its right border
+            inside &= w + step > 0
+        else:
+            # right (or horizontal) edge: the pixel is covered if it lies on or before the edge
+            inside &= w >= 0
+        weights.append(w)
+
+    ys, xs = np.nonzero(inside)
+    weights = np.stack([w[ys, xs] for w in weights], axis=1) / abs(area)
+
+    return ys + y_min, xs + x_min, weights
+
+
+def depth_plane(vertices, vdepth):
+    # calculates the coefficients of the plane z = c + a * x + b * y that interpolates linearly the depth of the
+    # vertices of a triangle over the image
+    # - vertices: 3x2 matrix containing in each row the 2D coordinates of one of the triangle's vertices
+    # - vdepth: 3x1 vector with the depth of each vertex
+    # - plane: the coefficients (c, a, b); a triangle with zero area gets the mean depth of its vertices everywhere
+
+    vertices = np.asarray(vertices, dtype=float)
+    vdepth = np.asarray(vdepth, dtype=float)
+
+    a, b, c = vertices
+    area = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+    if area == 0:
+        return vdepth.mean(), 0.0, 0.0
+
+    dz1, dz2 = vdepth[1] - vdepth[0], vdepth[2] - vdepth[0]
+    dz_dx = (dz1 * (c[1] - a[1]) - dz2 * (b[1] - a[1])) / area
+    dz_dy = (dz2 * (b[0] - a[0]) - dz1 * (c[0] - a[0])) / area
+
+    return vdepth[0] - dz_dx * a[0] - dz_dy * a[1], dz_dx, dz_dy
+
+
+def depth_planes(vertices, vdepth):
+    # calculates the depth planes of many triangles at once, as depth_plane does for each of them
+    # - vertices: Tx3x2 array with the 2D coordinates of the vertices of T triangles
+    # - vdepth: Tx3 matrix with the depth of the vertices of each triangle
+    # - planes: Tx3 matrix with the coefficients (c, a, b) of the plane of each triangle
+
+    vertices = np.asarray(vertices, dtype=float)
+    vdepth = np.asarray(vdepth, dtype=float)
+
+    a, b, c = vertices[:, 0], vertices[:, 1], vertices[:, 2]
+    area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+
+    dz1, dz2 = vdepth[:, 1] - vdepth[:, 0], vdepth[:, 2] - vdepth[:, 0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dz_dx = (dz1 * (c[:, 1] - a[:, 1]) - dz2 * (b[:, 1] - a[:, 1])) / area
+        dz_dy = (dz2 * (b[:, 0] - a[:, 0]) - dz1 * (c[:, 0] - a[:, 0])) / area
+        planes = np.column_stack((vdepth[:, 0] - dz_dx * a[:, 0] - dz_dy * a[:, 1], dz_dx, dz_dy))
+
+    # a triangle with zero area gets the mean depth of its vertices everywhere
+    flat = area == 0
+    planes[flat] = 0
+    planes[flat, 0] = vdepth[flat].mean(axis=1)
+
+    return planes
+
+
+def depth_test(zbuffer, plane, x, y):
+    # checks if the point (x, y) of a triangle is nearer than whatever has already been drawn on that pixel and, if
+    # so, stores its depth in the zbuffer
+    # - zbuffer: MxN matrix with the depth of the nearest point drawn on each pixel, or None to draw everything
+    # - plane: the depth plane of the triangle (see depth_plane)
+    # - x, y: pixel coordinates
+    # - visible: True if the point should be drawn
+
+    if zbuffer is None:
+        return True
+
+    z = plane[0] + plane[1] * x + plane[2] * y
+    if z >= zbuffer[y, x]:
+        return False
+
+    zbuffer[y, x] = z
+    return True
+
+
+def interpolate_span(x1, x2, V1, V2, xs):
+    # interpolates linearly between the values V1 at x1 and V2 at x2 on all the pixels of a span at once; every
+    # pixel gets what interpolate_vectors gives it, so the span is filled with a single vector operation
+    # - x1, x2: the x of the two ends of the span
+    # - V1, V2: the values at the two ends
+    # - xs: vector with the x of the pixels of the span
+    # - V: len(xs) x C matrix with the values of the pixels
+
+    if (x2 - x1) == 0:
+        return np.tile(V1, (len(xs), 1))
+
+    t = (xs - x1) / (x2 - x1)
+    return V1 + t[:, np.newaxis] * np.subtract(V2, V1)
+
+
+def depth_test_span(zbuffer, plane, xs, y):
+    # depth_test for all the pixels of a span of row y at once
+    # - zbuffer, plane: as in depth_test
+    # - xs: vector with the x of the pixels of the span
+    # - visible: the x of the pixels that should be drawn (their depth is stored in the zbuffer)
+
+    if zbuffer is None:
+        return xs
+
+    z = plane[0] + plane[1] * xs + plane[2] * y
+    nearer = ~(z >= zbuffer[y, xs])
+    visible = xs[nearer]
+    zbuffer[y, visible] = z[nearer]
+
+    return visible
+
+
+def depth_filter(zbuffer, ys, xs, weights, vdepth):
+    # keeps only the pixels of a triangle that are nearer than whatever has already been drawn on them and stores
+    # their depth in the zbuffer
+    # - zbuffer: MxN matrix with the depth of the nearest point drawn on each pixel, or None to keep everything
+    # - ys, xs, weights: the covered pixels of the triangle and their barycentric weights (see edge_coverage)
+    # - vdepth: 3x1 vector with the depth of each vertex
+
+    if zbuffer is None:
+        return ys, xs, weights
+
+    z = weights @ np.asarray(vdepth, dtype=float)
+    visible = z < zbuffer[ys, xs]
+    ys, xs, weights = ys[visible], xs[visible], weights[visible]
+    zbuffer[ys, xs] = z[visible]
+
+    return ys, xs, weights
+
+
+def nearest_writes(keys, ranks, z, zbuffer):
+    # resolves at once which of many writes of points to pixels pass the depth test, with the same result as testing
+    # them one after the other in the order of their ranks (a point is drawn if it is nearer than what the zbuffer
+    # holds, which then stores its depth in the type of the zbuffer)
+    # - keys: vector with the flat index of the pixel of each write
+    # - ranks: vector with the position of each write in the drawing order; a pixel gets at most one write per rank
+    # - z: vector with the depth of each write
+    # - zbuffer: MxN matrix with the depth of the nearest point drawn on each pixel; it is updated
+    # - writes: the indices of the writes that stay on their pixels
+
+    pixels, group = np.unique(keys, return_inverse=True)
+    group = group.ravel()
+    stored = zbuffer.flat[pixels]
+    rounded = z.astype(zbuffer.dtype)
+
+    # the nearest depth of each pixel, as it gets stored, and the first write that stores it
+    order = np.lexsort((ranks, rounded, group))
+    first = order[np.searchsorted(group[order], np.arange(len(pixels)))]
+    nearest = rounded[first]
+    drawn = np.bincount(group, weights=~(z >= stored[group]), minlength=len(pixels)) > 0
+
+    # once the zbuffer holds the nearest stored depth, the later writes that are nearer than it still pass; when it
+    # held that depth from the start, every write nearer than it passes
+    winner = np.where(nearest < stored, ranks[first], -1)
+    later = (z < nearest[group]) & (ranks > winner[group])
+    np.maximum.at(winner, group[later], ranks[later])
+
+    writes = np.flatnonzero(drawn[group] & (ranks == winner[group]))
+    zbuffer.flat[keys[writes]] = z[writes]
+
+    return writes
+
+
+def degenerate_triangles(verts2d, faces):
+    # finds the triangles whose vertices fall on fewer than 3 distinct pixels
+    # - verts2d: N_v × 2 matrix with the pixel coordinates of each vertex
+    # - faces: N_t × 3 matrix with the indices of the vertices of each triangle
+    # - degenerate: boolean vector, True for the triangles with fewer than 3 distinct vertices
+    # - point: boolean vector, True for the triangles whose 3 vertices are on the same pixel
+
+    v = verts2d[faces]
+    same01 = np.all(v[:, 0] == v[:, 1], axis=1)
+    same12 = np.all(v[:, 1] == v[:, 2], axis=1)
+    same02 = np.all(v[:, 0] == v[:, 2], axis=1)
+
+    return same01 | same12 | same02, same01 & same12
+
+
+def distinct_vertices(vertices):
+    # counts the distinct vertices of a triangle without sorting them (as np.unique does)
+    # - vertices: 3x2 matrix containing in each row the 2D coordinates of one of the triangle's vertices
+    # - count: the number of distinct vertices, from 1 to 3
+
+    return len(set(map(tuple, np.asarray(vertices).tolist())))
+
+
+def fill_points(canvas, pixels, colors, depths=None, zbuffer=None):
+    # draws P triangles whose vertices all fall on a single pixel at once, with the same result as drawing them one
+    # after the other: the last one drawn on a pixel covers the others or, with a zbuffer, the first of the nearest
+    # ones is kept if it is nearer than what was already drawn there
+    # - canvas: MxNx3 image (perhaps) with pre-existing triangles
+    # - pixels: Px2 matrix with the (x, y) coordinates of the pixel of each point, in drawing order
+    # - colors: Px3 matrix with the color of each point
+    # - depths: P vector with the depth of each point, only used along with zbuffer
+    # - zbuffer: MxN matrix with the depth of the nearest point drawn on each pixel, or None to draw everything
+    # - updatedcanvas: MxNx3 matrix with the points on top of the input canvas
+
+    M, N = canvas.shape[:2]
+    keys = np.ravel_multi_index((pixels[:, 1], pixels[:, 0]), (M, N), mode="wrap")
+
+    if zbuffer is None:
+        # the last point of each pixel
+        _, last = np.unique(keys[::-1], return_index=True)
+        keep = len(keys) - 1 - last
     else:
-        x2 = edges[active_edges[1]].vertices[0, 0]
-        y2 = edges[active_edges[1]].vertices[0, 1]
-        color2 = edges[active_edges[1]].vcolors[0, :]
+        # the first of the nearest points of each pixel, if it passes the depth test
+        order = np.lexsort((np.arange(len(keys)), depths, keys))
+        _, first = np.unique(keys[order], return_index=True)
+        keep = order[first]
+        keep = keep[~(depths[keep] >= zbuffer.flat[keys[keep]])]
+
+    ys, xs = np.unravel_index(keys[keep], (M, N))
+    if zbuffer is not None:
+        zbuffer[ys, xs] = depths[keep]
+    canvas[ys, xs] = canvas_color(colors[keep], canvas)
+
+    return canvas
 
-    return x1, y1, x2, y2, color1, color2
 
+# numpy types of the geometry (coordinates, colors and depth), of the vertex indices and of the canvas for each
+# precision mode; "half" and "compact" keep the geometry in single precision and only shrink the canvas
+PRECISIONS = {"double": (np.float64, np.int64, np.float64),
+              "single": (np.float32, np.int32, np.float32),
+              "half": (np.float32, np.int32, np.float16),
+              "compact": (np.float32, np.int32, np.uint8)}
 
-def update_active_edges(edges, active_edges, y):
-    # updates the active edges after every iteration (scanning on the y-axis)
-    # - edges: list of the edges of the triangle
-    # - active_edges: list of the active edges of the triangle in that particular scanline
-    # - y: current y-coordinate
 
-    if y == edges[active_edges[0]].y_max:
+def canvas_color(colors, canvas):
+    # converts colors in [0, 1] to the type of the canvas they are written to; integer canvases store them as levels
+    # from 0 to the largest value of their type (e.g. 0..255 for uint8)
+    # - colors: a color or an array of colors
+    # - canvas: the canvas the colors are written to
+    # - colors: the colors as they are stored in the canvas
 
-        for i in range(len(edges)):
+    if canvas.dtype.kind in "ui":
+        return np.rint(np.clip(colors, 0, 1) * np.iinfo(canvas.dtype).max)
 
-            if y == edges[i].y_min:
-                active_edges[0] = i
+    return colors
 
-    elif y == edges[active_edges[1]].y_max:
 
-        for i in range(len(edges)):
+def new_canvas(shape, color, dtype):
+    # allocates a canvas of a given type filled with a color
+    # - shape: the shape of the canvas (e.g. (M, N, 3))
+    # - color: the background color, with values in [0, 1]
+    # - dtype: the type of the canvas (see PRECISIONS)
+    # - canvas: the new canvas
 
-            if y == edges[i].y_min:
-                active_edges[1] = i
+    canvas = np.empty(shape, dtype=dtype)
+    canvas[...] = canvas_color(color, canvas)
 
-    return active_edges
+    return canvas
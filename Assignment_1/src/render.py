@@ -1,22 +1,52 @@
 from flats import *
 from gourauds import *
+from stats import *
+import warnings
 
 
-def shade_triangle(canvas, vertices, vcolors, shade_t):
+def shade_triangle(canvas, vertices, vcolors, shade_t, engine="scanline", vdepth=None, zbuffer=None, setup=None):
     # calls for the respective triangle shading function depending on
-    # the shade_t = {"flat", "gouraud"} variable
+    # the shade_t = {"flat", "gouraud"} and engine = {"scanline", "halfspace"} variables;
+    # vdepth and zbuffer are passed on for depth testing and setup (see triangle_setup) to the scanline functions
+
+    if engine not in ["scanline", "halfspace"]:
+        raise ValueError("Invalid value for engine. Must be 'scanline' or 'halfspace'.")
 
     if shade_t == "flat":
-        updatedcanvas = flats(canvas, vertices, vcolors)
+        if engine == "scanline":
+            updatedcanvas = flats(canvas, vertices, vcolors, vdepth, zbuffer, setup)
+        else:
+            updatedcanvas = flats_halfspace(canvas, vertices, vcolors, vdepth, zbuffer)
     elif shade_t == "gouraud":
-        updatedcanvas = gourauds(canvas, vertices, vcolors)
+        if engine == "scanline":
+            updatedcanvas = gourauds(canvas, vertices, vcolors, vdepth, zbuffer, setup)
+        else:
+            updatedcanvas = gourauds_halfspace(canvas, vertices, vcolors, vdepth, zbuffer)
     else:
         raise ValueError("Invalid value for shade_t. Must be 'flat' or 'gouraud'.")
 
     return updatedcanvas
 
 
-def render(verts2d, faces, vcolors, depth, shade_t):
+def shade_points(canvas, verts2d, faces, vcolors, depth, triangles, zbuffer=None):
+    # draws triangles whose vertices are all on the same pixel at once, as flats and gourauds draw each of them: the
+    # pixel gets the mean color and, for the depth test, the mean depth of the vertices
+    # - canvas: MxNx3 image (perhaps) with pre-existing triangles
+    # - verts2d, faces, vcolors, depth: as in render
+    # - triangles: the indices of the triangles, in drawing order
+    # - zbuffer: MxN matrix with the depth of the nearest point drawn on each pixel, or None to draw everything
+    # - updatedcanvas: MxNx3 matrix with the points on top of the input canvas
+
+    indices = np.asarray(faces)[triangles]
+    pixels = np.asarray(verts2d)[indices[:, 0]]
+    colors = np.asarray(vcolors)[indices].mean(axis=1)
+    depths = np.asarray(depth)[indices].mean(axis=1) if zbuffer is not None else None
+
+    return fill_points(canvas, pixels, colors, depths, zbuffer)
+
+
+def render(verts2d, faces, vcolors, depth, shade_t, engine="scanline", visibility="painter", precision=None,
+           stats=None):
     # renders the final image
     # - img: colored image of dimensions MxNx3 containing K colored triangles forming
     # a projection of a 3D image onto the 2D plane
@@ -27,26 +57,100 @@ def render(verts2d, faces, vcolors, depth, shade_t):
     # triangle vertices
     # - depth: Lx1 matrix containing the depth of each vertex
     # - shade_t: string {"flat", "gouraud"} deciding the coloring function
+    # - engine: string {"scanline", "halfspace", "bulk"} deciding whether the triangles are filled by scanning their
+    # edges or by evaluating their edge functions over their bounding boxes as arrays; "bulk" (only for flat
+    # shading) fills all of them at once with flats_bulk, with the same result as "scanline"
+    # - visibility: string {"painter", "zbuffer"} deciding whether hidden points are covered by drawing the
+    # triangles from the farthest to the nearest or rejected per pixel with a depth buffer
+    # - precision: string {"double", "single", "half", "compact"} deciding the types of the geometry, the indices
+    # and the canvas (see PRECISIONS); None keeps the types of the given arrays and draws on a float64 canvas
+    # - stats: optional RenderStats that records the time of the depth sort ("sort") and of the filling of the
+    # triangles ("shading"), the triangles submitted and skipped as degenerate, the pixels written and the overdraw
     # - M, N: height and width of the canvas
+    # The triangles with fewer than 3 distinct vertices are sorted out at once before the filling: those that cannot
+    # be formed are skipped and those whose vertices are all on the same pixel are drawn together with fill_points
 
-    # check if shade_t is of accepted value
+    # check if shade_t and visibility are of accepted value
     assert shade_t in ["flat", "gouraud"]
+    assert engine != "bulk" or shade_t == "flat"
+    assert visibility in ["painter", "zbuffer"]
+    assert precision is None or precision in PRECISIONS
 
     # set canvas dimensions
     M = N = 512
 
+    if precision is None:
+        float_type = canvas_type = float
+    else:
+        float_type, index_type, canvas_type = PRECISIONS[precision]
+        verts2d, faces = np.asarray(verts2d, dtype=index_type), np.asarray(faces, dtype=index_type)
+        vcolors, depth = np.asarray(vcolors, dtype=float_type), np.asarray(depth, dtype=float_type)
+
     # set white background
-    img = np.ones((M, N, 3))
+    img = new_canvas((M, N, 3), 1, canvas_type)
+
+    with timed(stats, "sort"):
+        # compute the average depth of each triangle
+        triangle_depth = depth[faces].mean(axis=1)  # Kx1
+
+        if visibility == "painter":
+            # sort the triangles by depth in descending order
+            sorted_triangles = triangle_depth.argsort()[::-1].tolist()  # Kx1
+            zbuffer = None
+        else:
+            # the depth buffer decides the visibility, so the order only matters for how many points get rejected
+            # early; drawing the nearest triangles first hides the most
+            sorted_triangles = triangle_depth.argsort().tolist()  # Kx1
+            zbuffer = np.full((M, N), np.inf, dtype=float_type)
+
+    # the triangles with fewer than 3 distinct vertices are skipped, unless they are a single point
+    degenerate, point = degenerate_triangles(np.asarray(verts2d), np.asarray(faces))
+    skipped = degenerate & ~point
+    if np.any(skipped):
+        warnings.warn("%d triangle(s) cannot be rendered because they have fewer than 3 distinct vertices."
+                      % np.count_nonzero(skipped))
+    if np.any(point):
+        warnings.warn("All vertices of %d triangle(s) have the same 2D coordinates, rendering single pixels."
+                      % np.count_nonzero(point))
+
+    if stats is not None:
+        stats.count("triangles_submitted", len(faces))
+        stats.count("degenerate_skipped", np.count_nonzero(skipped))
+        img = stats.trace(img)
+
+    with timed(stats, "shading"):
+        sorted_triangles = [triangle for triangle in sorted_triangles if not skipped[triangle]]
+
+        if engine == "bulk":
+            img = flats_bulk(img, verts2d, faces, vcolors, sorted_triangles, depth, zbuffer)
+        else:
+            filled = [triangle for triangle in sorted_triangles if not point[triangle]]
+
+            # the scanning of all the filled triangles is prepared at once
+            if engine == "scanline":
+                setups = iter(triangle_setup(np.asarray(verts2d)[np.asarray(faces)[filled]]))
+            else:
+                setups = iter([None] * len(filled))
+
+            # consecutive single pixel triangles are drawn together, before the next filled triangle covers them
+            points = []
+            for triangle in sorted_triangles + [None]:
+                if triangle is not None and point[triangle]:
+                    points.append(triangle)
+                    continue
+
+                if points:
+                    img = shade_points(img, verts2d, faces, vcolors, depth, points, zbuffer)
+                    points = []
 
-    # compute the average depth of each triangle
-    triangle_depth = depth[faces].mean(axis=1)  # Kx1
+                if triangle is not None:
+                    indices = faces[triangle]
+                    triangle_vertices = np.array(verts2d[indices])
+                    triangle_vcolors = np.array(vcolors[indices])
+                    img = shade_triangle(img, triangle_vertices, triangle_vcolors, shade_t, engine, depth[indices],
+                                         zbuffer, next(setups))
 
-    # sort the triangles by depth in descending order
-    sorted_triangles = triangle_depth.argsort()[::-1].tolist()  # Kx1
+    if stats is not None:
+        img = stats.untrace(img)
 
-    for triangle in sorted_triangles:
-        indices = faces[triangle]
-        triangle_vertices = np.array(verts2d[indices])
-        triangle_vcolors = np.array(vcolors[indices])
-        img = shade_triangle(img, triangle_vertices, triangle_vcolors, shade_t)
     return img
@@ -0,0 +1,38 @@
+from render import *
+
+
+def render_animation(p3d, faces, vcolors, keyframes, H, W, rows, cols, f, cv, ck, cup, engine="scanline",
+                     visibility="painter", precision=None):
+    # Renders a sequence of frames of an object moved by a list of keyframe transforms. The model transform of every
+    # frame is composed with the view and projection transforms into a single 4*4 matrix, which is applied to the
+    # homogeneous vertices with one matrix product into buffers that are allocated once for the whole sequence.
+    # - p3d: 3*N numpy array with the 3D coordinates of points in the WCS
+    # - faces, vcolors: as in render_object
+    # - keyframes: list of 4*4 homogeneous model matrices, one per frame (see rotate_translate_matrix and compose)
+    # - H, W, rows, cols, f, cv, ck, cup, engine, visibility, precision: as in render_object
+    # - img: yields the image of each frame
+
+    if precision is None:
+        float_type, index_type = float, int
+    else:
+        float_type, index_type, _ = PRECISIONS[precision]
+
+    # Camera transforms shared by all the frames
+    PV = np.dot(perspective_matrix(f, H, W, rows, cols), view_matrix(cv, ck, cup))
+
+    # Homogeneous vertices and the per frame buffers
+    points = np.ones((4, p3d.shape[1]), dtype=float_type)
+    points[:3] = p3d
+    projected = np.empty((4, p3d.shape[1]), dtype=float_type)
+    n2d = np.empty((p3d.shape[1], 2), dtype=index_type)
+
+    for T in keyframes:
+        np.dot(np.dot(PV, T).astype(float_type), points, out=projected)
+
+        # Perspective divide and rounding to the pixel coordinates
+        projected[:2] /= projected[3]
+        np.around(projected[:2], out=projected[:2])
+        n2d[:, 0] = projected[0]
+        n2d[:, 1] = projected[1]
+
+        yield render(n2d, faces, vcolors, projected[2], "gouraud", engine, visibility, precision)
@@ -2,7 +2,7 @@ from helpers import *
 import warnings
 
 
-def flats(canvas, vertices, vcolors):
+def flats(canvas, vertices, vcolors, vdepth=None, zbuffer=None, setup=None):
     # triangle filling function where all the inner points of the triangle get the
     # mean value of the colors of its vertices
     # - canvas: MxNx3 image (perhaps) with pre-existing triangles
@@ -10,6 +10,10 @@ def flats(canvas, vertices, vcolors):
     # triangle's vertices
     # - vcolors: 3x3 matrix containing in each row the color of one of the vertices in
     # RGB form and with values in the spectrum [0, 1]
+    # - vdepth: 3x1 vector with the depth of each vertex, only used along with zbuffer
+    # - zbuffer: MxN matrix with the depth of the nearest point drawn on each pixel; if given, points that are not
+    # nearer than it are not drawn and it is updated with the depth of the drawn ones
+    # - setup: the record of the triangle from triangle_setup, when it was prepared along with other triangles
     # - updatedcanvas: MxNx3 matrix containing for each point of the triangle (vertices
     # and inner points) the calculated RGB values as well as the pre-existing triangles
     # of the input canvas covering possible common colored points with the pre-existing
@@ -18,85 +22,166 @@ def flats(canvas, vertices, vcolors):
     # initialize updatedcanvas as canvas
     updatedcanvas = canvas
 
+    if setup is None:
+        setup = triangle_setup(np.asarray(vertices)[np.newaxis])[0]
+
     # check if all vertices have the same 2D coordinates
-    if np.all(vertices[:, 0] == vertices[0, 0]) and np.all(vertices[:, 1] == vertices[0, 1]):
+    if setup["distinct"] == 1:
         # get the common x and y coordinates
         x, y = vertices[0, 0], vertices[0, 1]
         # set the color of the single pixel as the average color of all vertices
-        updatedcanvas[y, x] = np.mean(vcolors, axis=0)
+        if zbuffer is None or depth_test(zbuffer, (np.mean(vdepth), 0, 0), x, y):
+            updatedcanvas[y, x] = canvas_color(np.mean(vcolors, axis=0), updatedcanvas)
 
         warnings.warn("All vertices in the mesh have the same 2D coordinates, rendering a single pixel.")
         return updatedcanvas
 
     # check if there are fewer than 3 distinct vertices and a triangle cannot be formed
-    if len(np.unique(vertices, axis=0)) < 3:
+    if setup["distinct"] < 3:
         warnings.warn("The triangle cannot be rendered because it has fewer than 3 distinct vertices.")
         return updatedcanvas
 
-    # define the minimum and the maximum y of the triangle
-    y_max = vertices[:, 1].max()
-    y_min = vertices[:, 1].min()
-
-    # initialize edge objects
-    edgeAB = Edge(np.array([vertices[0, :], vertices[1, :]]), np.array([vcolors[0, :], vcolors[1, :]]),
-                  slope(vertices[0, :], vertices[1, :]), False)
-    edgeBC = Edge(np.array([vertices[1, :], vertices[2, :]]), np.array([vcolors[1, :], vcolors[2, :]]),
-                  slope(vertices[1, :], vertices[2, :]), False)
-    edgeCA = Edge(np.array([vertices[0, :], vertices[2, :]]), np.array([vcolors[0, :], vcolors[2, :]]),
-                  slope(vertices[0, :], vertices[2, :]), False)
-
-    # initialize parameters that will be used for the scanning
-    active_edges = []
-    edges = [edgeAB, edgeBC, edgeCA]
-    horizontal_line = False
-
-    # find the active edges list of the scanning line y == y_min
-    for i in range(len(edges)):
-
-        if y_min == edges[i].y_min:
-
-            if edges[i].edge_slope != 0:
-                active_edges.append(i)
-                edges[i].is_active = True
-            else:
-                horizontal_line = True
-
-    # check if there are not enough active edges
-    if len(active_edges) < 2:
+    # plane interpolating the depth of the vertices
+    plane = depth_plane(vertices, vdepth) if zbuffer is not None else None
+
+    # check if all the vertices are on the same row and there are not enough active edges
+    if not setup["fill"]:
         return updatedcanvas
 
-    # check the condition where y = y_min and do the appropriate filling
-    if not horizontal_line:
-        x1 = x2 = -1
-        index = None
+    # define the minimum and the maximum y of the triangle
+    y_min, y_max = int(setup["y_min"]), int(setup["y_max"])
+    x1, x2 = setup["x_start"]
 
-        for i in range(len(vertices)):
-            if vertices[i, 1] == y_min:
-                x1 = vertices[i, 0]
-                x2 = x1
-                index = i
-        updatedcanvas[int(round(y_min)), int(round(x1))] = vcolors[index, :]
+    # check the condition where y = y_min and do the appropriate filling
+    if not setup["horizontal"]:
+        index = setup["start_vertex"][0]
+        if depth_test(zbuffer, plane, int(round(x1)), int(round(y_min))):
+            updatedcanvas[int(round(y_min)), int(round(x1))] = canvas_color(vcolors[index, :], updatedcanvas)
 
     else:
-        x1, y1, x2, y2, color1, color2 = initialize_variables(edges, active_edges)
-        for x in range(x1, x2 + 1):
-            updatedcanvas[y_min, x] = np.mean(vcolors, axis=0)
+        span = np.arange(x1, x2 + 1)
+        span = depth_test_span(zbuffer, plane, span, y_min)
+        updatedcanvas[y_min, span] = canvas_color(np.mean(vcolors, axis=0), updatedcanvas)
 
-    # filling algorith (first scan every row and then scan every column)
-    for y in range(y_min + 1, y_max + 1):
+    # filling algorith (first scan every row and then fill the visible pixels of its span at once)
+    color = canvas_color(np.mean(vcolors, axis=0), updatedcanvas)
+    ys, xs, _ = scan_edges(setup, y_max)
+    for y, (x1, x2) in zip(ys.tolist(), xs):
+        span = np.arange(int(min(x1, x2)), int(max(x1, x2)) + 1)
+        updatedcanvas[y, depth_test_span(zbuffer, plane, span, y)] = color
 
-        if edges[active_edges[0]].edge_slope != float('inf'):
-            x1 = x1 + 1 / edges[active_edges[0]].edge_slope
+    return updatedcanvas
 
-        if edges[active_edges[1]].edge_slope != float('inf'):
-            x2 = x2 + 1 / edges[active_edges[1]].edge_slope
 
-        for x in range(int(min(x1, x2)), int(max(x1, x2)) + 1):
-            updatedcanvas[y, int(round(x))] = np.mean(vcolors, axis=0)
+def flats_halfspace(canvas, vertices, vcolors, vdepth=None, zbuffer=None):
+    # same as flats, but the inner points of the triangle are found by evaluating its edge functions over its
+    # bounding box as arrays and are colored with a single masked assignment instead of a scanline loop
+    # - canvas: MxNx3 image (perhaps) with pre-existing triangles
+    # - vertices: 3x2 matrix containing in each row the 2D coordinates of one of the
+    # triangle's vertices
+    # - vcolors: 3x3 matrix containing in each row the color of one of the vertices in
+    # RGB form and with values in the spectrum [0, 1]
+    # - vdepth: 3x1 vector with the depth of each vertex, only used along with zbuffer
+    # - zbuffer: MxN matrix with the depth of the nearest point drawn on each pixel; if given, points that are not
+    # nearer than it are not drawn and it is updated with the depth of the drawn ones
+    # - updatedcanvas: MxNx3 matrix with the filled triangle on top of the input canvas
+
+    # initialize updatedcanvas as canvas
+    updatedcanvas = canvas
+
+    distinct = distinct_vertices(vertices)
+
+    # check if all vertices have the same 2D coordinates
+    if distinct == 1:
+        # get the common x and y coordinates
+        x, y = vertices[0, 0], vertices[0, 1]
+        # set the color of the single pixel as the average color of all vertices
+        if zbuffer is None or depth_test(zbuffer, (np.mean(vdepth), 0, 0), x, y):
+            updatedcanvas[y, x] = canvas_color(np.mean(vcolors, axis=0), updatedcanvas)
+
+        warnings.warn("All vertices in the mesh have the same 2D coordinates, rendering a single pixel.")
+        return updatedcanvas
+
+    # check if there are fewer than 3 distinct vertices and a triangle cannot be formed
+    if distinct < 3:
+        warnings.warn("The triangle cannot be rendered because it has fewer than 3 distinct vertices.")
+        return updatedcanvas
+
+    ys, xs, weights = edge_coverage(vertices, canvas.shape[0], canvas.shape[1])
+    ys, xs, weights = depth_filter(zbuffer, ys, xs, weights, vdepth)
+    updatedcanvas[ys, xs] = canvas_color(np.mean(vcolors, axis=0), updatedcanvas)
+
+    return updatedcanvas
+
+
+def flats_bulk(canvas, verts2d, faces, vcolors, triangles, depth=None, zbuffer=None):
+    # fills many triangles at once with the same pixels and colors as flats fills them one after the other: the
+    # colors of all the triangles are computed with a single mean, the spans of all their rows are found and expanded
+    # to pixels together and every pixel is written once, with the color of the triangle that flats would leave on it
+    # - canvas: MxNx3 image (perhaps) with pre-existing triangles
+    # - verts2d, faces, vcolors, depth: as in render
+    # - triangles: the indices of the triangles to fill, in drawing order
+    # - zbuffer: MxN matrix with the depth of the nearest point drawn on each pixel; if given, points that are not
+    # nearer than it are not drawn and it is updated with the depth of the drawn ones; otherwise every triangle covers
+    # the ones drawn before it
+    # - updatedcanvas: MxNx3 matrix with the filled triangles on top of the input canvas
+
+    # initialize updatedcanvas as canvas
+    updatedcanvas = canvas
+
+    indices = np.asarray(faces)[triangles]
+    vertices = np.asarray(verts2d)[indices]
+    vcolors = np.asarray(vcolors)
+    setup = triangle_setup(vertices)
+
+    # the mean color of every triangle, followed by the colors of the vertices for the pixels that get them
+    colors = np.concatenate((vcolors[indices].mean(axis=1), vcolors))
+
+    # the pixels of the triangles that are a single point
+    point = np.flatnonzero(setup["distinct"] == 1)
+
+    # the first row of the triangles: a single pixel with the color of the vertex the edges start from, or the
+    # lowest (horizontal) edge
+    fill = setup["fill"]
+    apex = np.flatnonzero(fill & ~setup["horizontal"])
+    edge = np.flatnonzero(fill & setup["horizontal"])
+
+    # the spans of the other rows
+    rows, ys, lo, hi = scan_spans(setup)
+
+    # every span, including the single pixels, as (triangle, row, first x, last x, color)
+    span_triangles = np.concatenate((point, apex, edge, rows))
+    span_ys = np.concatenate((vertices[point, 0, 1], setup["y_min"][apex], setup["y_min"][edge], ys))
+    span_lo = np.concatenate((vertices[point, 0, 0], setup["x_start"][apex, 0], setup["x_start"][edge, 0], lo))
+    span_hi = np.concatenate((vertices[point, 0, 0], setup["x_start"][apex, 0], setup["x_start"][edge, 1], hi))
+    span_colors = np.concatenate((point, len(indices) + indices[apex, setup["start_vertex"][apex, 0]], edge, rows))
+
+    spans, xs = expand_spans(span_lo.astype(np.int64), span_hi.astype(np.int64))
+    ranks, ys, color = span_triangles[spans], span_ys[spans].astype(np.int64), span_colors[spans]
+
+    M, N = canvas.shape[0], canvas.shape[1]
+    keys = np.ravel_multi_index((ys, xs), (M, N), mode="wrap")
+
+    # check if none of the triangles covers a pixel
+    if len(keys) == 0:
+        return updatedcanvas
+
+    if zbuffer is None:
+        # the last triangle drawn on each pixel covers the others
+        order = np.lexsort((ranks, keys))
+        last = np.append(keys[order][1:] != keys[order][:-1], True)
+        writes = order[last]
+    else:
+        # the depth plane of every triangle; the single points get the mean depth of their vertices
+        vdepth = np.asarray(depth)[indices]
+        planes = depth_planes(vertices, vdepth)
+        z = planes[ranks, 0] + planes[ranks, 1] * xs + planes[ranks, 2] * ys
+        is_point = spans < len(point)
+        z[is_point] = vdepth[ranks[is_point]].mean(axis=1)
 
-        if y == y_max:
-            break
+        writes = nearest_writes(keys, ranks, z, zbuffer)
 
-        active_edges = update_active_edges(edges, active_edges, y)
+    ys, xs = np.unravel_index(keys[writes], (M, N))
+    updatedcanvas[ys, xs] = canvas_color(colors[color[writes]], updatedcanvas)
 
     return updatedcanvas
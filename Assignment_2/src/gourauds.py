@@ -2,7 +2,7 @@ from helpers import *
 import warnings
 
 
-def gourauds(canvas, vertices, vcolors):
+def gourauds(canvas, vertices, vcolors, vdepth=None, zbuffer=None, setup=None):
     # triangle filling function where the inner points of the triangle get the
     # RGB values that result from the linear interpolation of the RGB values of
     # its vertices (first vertically and then horizontally)
@@ -11,6 +11,10 @@ def gourauds(canvas, vertices, vcolors):
     # triangle's vertices
     # - vcolors: 3x3 matrix containing in each row the color of one of the vertices in
     # RGB form and with values in the spectrum [0, 1]
+    # - vdepth: 3x1 vector with the depth of each vertex, only used along with zbuffer
+    # - zbuffer: MxN matrix with the depth of the nearest point drawn on each pixel; if given, points that are not
+    # nearer than it are not drawn and it is updated with the depth of the drawn ones
+    # - setup: the record of the triangle from triangle_setup, when it was prepared along with other triangles
     # - updatedcanvas: MxNx3 matrix containing for each point of the triangle (vertices
     # and inner points) the calculated RGB values as well as the pre-existing triangles
     # of the input canvas covering possible common colored points with the pre-existing
@@ -19,98 +23,98 @@ def gourauds(canvas, vertices, vcolors):
     # initialize updatedcanvas as canvas
     updatedcanvas = canvas
 
+    if setup is None:
+        setup = triangle_setup(np.asarray(vertices)[np.newaxis])[0]
+
     # check if all vertices have the same 2D coordinates
-    if np.all(vertices[:, 0] == vertices[0, 0]) and np.all(vertices[:, 1] == vertices[0, 1]):
+    if setup["distinct"] == 1:
         # get the common x and y coordinates
         x, y = vertices[0, 0], vertices[0, 1]
         # set the color of the single pixel as the average color of all vertices
-        updatedcanvas[y, x] = np.mean(vcolors, axis=0)
+        if zbuffer is None or depth_test(zbuffer, (np.mean(vdepth), 0, 0), x, y):
+            updatedcanvas[y, x] = canvas_color(np.mean(vcolors, axis=0), updatedcanvas)
 
         warnings.warn("All vertices in the mesh have the same 2D coordinates, rendering a single pixel.")
         return updatedcanvas
 
     # check if there are fewer than 3 distinct vertices and a triangle cannot be formed
-    if len(np.unique(vertices, axis=0)) < 3:
+    if setup["distinct"] < 3:
         warnings.warn("The triangle cannot be rendered because it has fewer than 3 distinct vertices.")
         return updatedcanvas
 
-    # define the minimum and the maximum y of the triangle
-    y_max = vertices[:, 1].max()
-    y_min = vertices[:, 1].min()
-
-    # initialize edge objects
-    edgeAB = Edge(np.array([vertices[0, :], vertices[1, :]]), np.array([vcolors[0, :], vcolors[1, :]]),
-                  slope(vertices[0, :], vertices[1, :]), False)
-    edgeBC = Edge(np.array([vertices[1, :], vertices[2, :]]), np.array([vcolors[1, :], vcolors[2, :]]),
-                  slope(vertices[1, :], vertices[2, :]), False)
-    edgeCA = Edge(np.array([vertices[2, :], vertices[0, :]]), np.array([vcolors[2, :], vcolors[0, :]]),
-                  slope(vertices[2, :], vertices[0, :]), False)
-
-    # initialize parameters that will be used for the scanning
-    active_edges = []
-    edges = [edgeAB, edgeBC, edgeCA]
-    horizontal_line = False
-
-    # find the active edges list of the scanning line y == y_min
-    for i in range(len(edges)):
-
-        if y_min == edges[i].y_min:
-
-            if edges[i].edge_slope != 0:
-                active_edges.append(i)
-                edges[i].is_active = True
-            else:
-                horizontal_line = True
-
-    # check if there are not enough active edges
-    if len(active_edges) < 2:
+    # plane interpolating the depth of the vertices
+    plane = depth_plane(vertices, vdepth) if zbuffer is not None else None
+
+    # check if all the vertices are on the same row and there are not enough active edges
+    if not setup["fill"]:
         return updatedcanvas
 
+    # define the minimum and the maximum y of the triangle
+    y_min, y_max = int(setup["y_min"]), int(setup["y_max"])
+    x1, x2 = setup["x_start"]
+
     # check the condition where y = y_min and do the appropriate filling
-    if not horizontal_line:
-        x1 = x2 = 0
-        index = None
+    if not setup["horizontal"]:
+        index = setup["start_vertex"][0]
+        if depth_test(zbuffer, plane, int(round(x1)), int(round(y_min))):
+            updatedcanvas[int(round(y_min)), int(round(x1))] = canvas_color(vcolors[index, :], updatedcanvas)
 
-        for i in range(len(vertices)):
-            if vertices[i, 1] == y_min:
-                x1 = vertices[i, 0]
-                x2 = x1
-                index = i
+    else:
+        color1, color2 = vcolors[setup["start_vertex"][0], :], vcolors[setup["start_vertex"][1], :]
+        span = np.arange(x1, x2 + 1)
+        span = depth_test_span(zbuffer, plane, span, y_min)
+        updatedcanvas[y_min, span] = canvas_color(interpolate_span(x1, x2, color1, color2, span), updatedcanvas)
 
-        updatedcanvas[int(round(y_min)), int(round(x1))] = vcolors[index, :]
+    # filling algorith (first scan every row and then fill the visible pixels of its span at once); the colors of
+    # the two edges of every row are interpolated at once
+    ys, xs, edges = scan_edges(setup, y_max)
+    edge_colors = edge_values(vertices, vcolors, edges, ys)
 
-    else:
-        x1, y1, x2, y2, color1, color2 = initialize_variables(edges, active_edges)
-        for x in range(x1, x2 + 1):
-            updatedcanvas[y_min, x] = interpolate_vectors([x1, y1], [x2, y2], color1, color2, x, 1)
-
-    # filling algorith (first scan every row and then scan every column)
-    for y in range(y_min + 1, y_max + 1):
-
-        if edges[active_edges[0]].edge_slope != float('inf'):
-            x1 = x1 + 1 / edges[active_edges[0]].edge_slope
-
-        if edges[active_edges[1]].edge_slope != float('inf'):
-            x2 = x2 + 1 / edges[active_edges[1]].edge_slope
-
-        colorA = interpolate_vectors(edges[active_edges[0]].vertices[0],
-                                     edges[active_edges[0]].vertices[1],
-                                     edges[active_edges[0]].vcolors[0, :],
-                                     edges[active_edges[0]].vcolors[1, :],
-                                     y, 2)
-        colorB = interpolate_vectors(edges[active_edges[1]].vertices[0],
-                                     edges[active_edges[1]].vertices[1],
-                                     edges[active_edges[1]].vcolors[0, :],
-                                     edges[active_edges[1]].vcolors[1, :],
-                                     y, 2)
-
-        for x in range(int(min(x1, x2)), int(max(x1, x2)) + 1):
-            updatedcanvas[y, int(round(x))] = interpolate_vectors([x1, y], [x2, y],
-                                                                  colorA, colorB,
-                                                                  x, 1)
-        if y == y_max:
-            break
-
-        active_edges = update_active_edges(edges, active_edges, y)
+    for y, (x1, x2), (colorA, colorB) in zip(ys.tolist(), xs, edge_colors):
+        span = np.arange(int(min(x1, x2)), int(max(x1, x2)) + 1)
+        span = depth_test_span(zbuffer, plane, span, y)
+        updatedcanvas[y, span] = canvas_color(interpolate_span(x1, x2, colorA, colorB, span), updatedcanvas)
+
+    return updatedcanvas
+
+
+def gourauds_halfspace(canvas, vertices, vcolors, vdepth=None, zbuffer=None):
+    # same as gourauds, but the inner points of the triangle are found by evaluating its edge functions over its
+    # bounding box as arrays and get the colors of the vertices weighted by their barycentric coordinates, which is
+    # the same linear interpolation as the vertical and then horizontal one of the scanline
+    # - canvas: MxNx3 image (perhaps) with pre-existing triangles
+    # - vertices: 3x2 matrix containing in each row the 2D coordinates of one of the
+    # triangle's vertices
+    # - vcolors: 3x3 matrix containing in each row the color of one of the vertices in
+    # RGB form and with values in the spectrum [0, 1]
+    # - vdepth: 3x1 vector with the depth of each vertex, only used along with zbuffer
+    # - zbuffer: MxN matrix with the depth of the nearest point drawn on each pixel; if given, points that are not
+    # nearer than it are not drawn and it is updated with the depth of the drawn ones
+    # - updatedcanvas: MxNx3 matrix with the filled triangle on top of the input canvas
+
+    # initialize updatedcanvas as canvas
+    updatedcanvas = canvas
+
+    distinct = distinct_vertices(vertices)
+
+    # check if all vertices have the same 2D coordinates
+    if distinct == 1:
+        # get the common x and y coordinates
+        x, y = vertices[0, 0], vertices[0, 1]
+        # set the color of the single pixel as the average color of all vertices
+        if zbuffer is None or depth_test(zbuffer, (np.mean(vdepth), 0, 0), x, y):
+            updatedcanvas[y, x] = canvas_color(np.mean(vcolors, axis=0), updatedcanvas)
+
+        warnings.warn("All vertices in the mesh have the same 2D coordinates, rendering a single pixel.")
+        return updatedcanvas
+
+    # check if there are fewer than 3 distinct vertices and a triangle cannot be formed
+    if distinct < 3:
+        warnings.warn("The triangle cannot be rendered because it has fewer than 3 distinct vertices.")
+        return updatedcanvas
+
+    ys, xs, weights = edge_coverage(vertices, canvas.shape[0], canvas.shape[1])
+    ys, xs, weights = depth_filter(zbuffer, ys, xs, weights, vdepth)
+    updatedcanvas[ys, xs] = canvas_color(weights @ vcolors, updatedcanvas)
 
     return updatedcanvas
@@ -25,6 +25,25 @@ def pin_hole(f, cv, cx, cy, cz, p3d):
     return p2d, depth
 
 
+def camera_axes(cv, ck, cup):
+    # Calculates the unit vectors of the coordinate system of a camera at cv looking at the point ck.
+    # - cv: 3D coordinates of the pinhole camera's center with respect to the WCS' s origin
+    # - ck: 3D coordinates of the target point K of the camera
+    # - cup: the unit up-vector
+    # - cx, cy, cz: the unit vectors x, y, z of the camera
+
+    cz = (cv - ck) / np.linalg.norm(cv - ck)
+    cx = np.cross(cup, cz)
+    cy = np.cross(cz, cx)
+
+    # Normalize cx, cy, and cz
+    cx /= np.linalg.norm(cx)
+    cy /= np.linalg.norm(cy)
+    cz /= np.linalg.norm(cz)
+
+    return cx, cy, cz
+
+
 def camera_looking_at(f, cv, ck, cup, p3d):
 
     # Produces the p2d projection of p3d points using the pin_hole() function, but takes into account the direction the
@@ -40,16 +59,43 @@ def camera_looking_at(f, cv, ck, cup, p3d):
     cv, ck, cup = cv.T[0], ck.T[0], cup.T[0]
 
     # Compute the camera coordinate system
-    cz = (cv - ck) / np.linalg.norm(cv - ck)
-    cx = np.cross(cup, cz)
-    cy = np.cross(cz, cx)
-
-    # Normalize cx, cy, and cz
-    cx /= np.linalg.norm(cx)
-    cy /= np.linalg.norm(cy)
-    cz /= np.linalg.norm(cz)
+    cx, cy, cz = camera_axes(cv, ck, cup)
 
     # Call pin_hole function with the computed camera coordinate system
     p2d, depth = pin_hole(f, cv, cx, cy, cz, p3d)
 
     return p2d, depth
+
+
+def view_matrix(cv, ck, cup):
+    # Calculates the 4*4 homogeneous matrix of the change to the camera coordinate system that pin_hole applies for a
+    # camera at cv looking at ck.
+    # - cv, ck, cup: as in camera_looking_at
+    # - V: 4*4 matrix that maps [p3d; 1] to [p3d_cam; 1]
+
+    cv, ck, cup = cv.T[0], ck.T[0], cup.T[0]
+    cx, cy, cz = camera_axes(cv, ck, cup)
+    R = np.column_stack((cx, cy, cz))
+
+    V = np.eye(4)
+    V[:3, :3] = R.T
+    V[:3, 3] = -np.dot(R.T, np.dot(R, cv))
+
+    return V
+
+
+def perspective_matrix(f, H, W, rows, cols):
+    # Calculates the 4*4 matrix that takes camera coordinates to homogeneous pixel coordinates: the pin_hole projection
+    # followed by the viewport mapping of rasterize. The pixel coordinates are the first two rows divided by the last
+    # one, while the third row is the depth.
+    # - f: focal length of the camera
+    # - H, W: height and width of the camera plane
+    # - rows, cols: number of rows and columns of the image
+    # - P: the 4*4 projection matrix
+
+    P = np.array([[f * rows / H, 0, rows / 2 + 0.5, 0],
+                  [0, -f * cols / W, cols / 2 + 0.5, 0],
+                  [0, 0, 1, 0],
+                  [0, 0, 1, 0]], dtype=float)
+
+    return P
@@ -1,23 +1,53 @@
 from flats import *
 from gourauds import *
+from stats import *
+import warnings
 from projection import *
 
 
-def shade_triangle(canvas, vertices, vcolors, shade_t):
+def shade_triangle(canvas, vertices, vcolors, shade_t, engine="scanline", vdepth=None, zbuffer=None, setup=None):
     # calls for the respective triangle shading function depending on
-    # the shade_t = {"flat", "gouraud"} variable
+    # the shade_t = {"flat", "gouraud"} and engine = {"scanline", "halfspace"} variables;
+    # vdepth and zbuffer are passed on for depth testing and setup (see triangle_setup) to the scanline functions
+
+    if engine not in ["scanline", "halfspace"]:
+        raise ValueError("Invalid value for engine. Must be 'scanline' or 'halfspace'.")
 
     if shade_t == "flat":
-        updatedcanvas = flats(canvas, vertices, vcolors)
+        if engine == "scanline":
+            updatedcanvas = flats(canvas, vertices, vcolors, vdepth, zbuffer, setup)
+        else:
+            updatedcanvas = flats_halfspace(canvas, vertices, vcolors, vdepth, zbuffer)
     elif shade_t == "gouraud":
-        updatedcanvas = gourauds(canvas, vertices, vcolors)
+        if engine == "scanline":
+            updatedcanvas = gourauds(canvas, vertices, vcolors, vdepth, zbuffer, setup)
+        else:
+            updatedcanvas = gourauds_halfspace(canvas, vertices, vcolors, vdepth, zbuffer)
     else:
         raise ValueError("Invalid value for shade_t. Must be 'flat' or 'gouraud'.")
 
     return updatedcanvas
 
 
-def render(verts2d, faces, vcolors, depth, shade_t):
+def shade_points(canvas, verts2d, faces, vcolors, depth, triangles, zbuffer=None):
+    # draws triangles whose vertices are all on the same pixel at once, as flats and gourauds draw each of them: the
+    # pixel gets the mean color and, for the depth test, the mean depth of the vertices
+    # - canvas: MxNx3 image (perhaps) with pre-existing triangles
+    # - verts2d, faces, vcolors, depth: as in render
+    # - triangles: the indices of the triangles, in drawing order
+    # - zbuffer: MxN matrix with the depth of the nearest point drawn on each pixel, or None to draw everything
+    # - updatedcanvas: MxNx3 matrix with the points on top of the input canvas
+
+    indices = np.asarray(faces)[triangles]
+    pixels = np.asarray(verts2d)[indices[:, 0]]
+    colors = np.asarray(vcolors)[indices].mean(axis=1)
+    depths = np.asarray(depth)[indices].mean(axis=1) if zbuffer is not None else None
+
+    return fill_points(canvas, pixels, colors, depths, zbuffer)
+
+
+def render(verts2d, faces, vcolors, depth, shade_t, engine="scanline", visibility="painter", precision=None,
+           stats=None):
     # renders the final image
     # - img: colored image of dimensions MxNx3 containing K colored triangles forming
     # a projection of a 3D image onto the 2D plane
@@ -28,28 +58,102 @@ def render(verts2d, faces, vcolors, depth, shade_t):
     # triangle vertices
     # - depth: Lx1 matrix containing the depth of each vertex
     # - shade_t: string {"flat", "gouraud"} deciding the coloring function
+    # - engine: string {"scanline", "halfspace", "bulk"} deciding whether the triangles are filled by scanning their
+    # edges or by evaluating their edge functions over their bounding boxes as arrays; "bulk" (only for flat
+    # shading) fills all of them at once with flats_bulk, with the same result as "scanline"
+    # - visibility: string {"painter", "zbuffer"} deciding whether hidden points are covered by drawing the
+    # triangles from the farthest to the nearest or rejected per pixel with a depth buffer
+    # - precision: string {"double", "single", "half", "compact"} deciding the types of the geometry, the indices
+    # and the canvas (see PRECISIONS); None keeps the types of the given arrays and draws on a float64 canvas
+    # - stats: optional RenderStats that records the time of the depth sort ("sort") and of the filling of the
+    # triangles ("shading"), the triangles submitted and skipped as degenerate, the pixels written and the overdraw
     # - M, N: height and width of the canvas
+    # The triangles with fewer than 3 distinct vertices are sorted out at once before the filling: those that cannot
+    # be formed are skipped and those whose vertices are all on the same pixel are drawn together with fill_points
 
-    # check if shade_t is of accepted value
+    # check if shade_t and visibility are of accepted value
     assert shade_t in ["flat", "gouraud"]
+    assert engine != "bulk" or shade_t == "flat"
+    assert visibility in ["painter", "zbuffer"]
+    assert precision is None or precision in PRECISIONS
 
     # set canvas dimensions
     M = N = 512
 
+    if precision is None:
+        float_type = canvas_type = float
+    else:
+        float_type, index_type, canvas_type = PRECISIONS[precision]
+        verts2d, faces = np.asarray(verts2d, dtype=index_type), np.asarray(faces, dtype=index_type)
+        vcolors, depth = np.asarray(vcolors, dtype=float_type), np.asarray(depth, dtype=float_type)
+
     # set white background
-    img = np.ones((M, N, 3))
+    img = new_canvas((M, N, 3), 1, canvas_type)
+
+    with timed(stats, "sort"):
+        # compute the average depth of each triangle
+        triangle_depth = depth[faces].mean(axis=1)  # Kx1
+
+        if visibility == "painter":
+            # sort the triangles by depth in descending order
+            sorted_triangles = triangle_depth.argsort()[::-1].tolist()  # Kx1
+            zbuffer = None
+        else:
+            # the depth buffer decides the visibility, so the order only matters for how many points get rejected
+            # early; drawing the nearest triangles first hides the most
+            sorted_triangles = triangle_depth.argsort().tolist()  # Kx1
+            zbuffer = np.full((M, N), np.inf, dtype=float_type)
+
+    # the triangles with fewer than 3 distinct vertices are skipped, unless they are a single point
+    degenerate, point = degenerate_triangles(np.asarray(verts2d), np.asarray(faces))
+    skipped = degenerate & ~point
+    if np.any(skipped):
+        warnings.warn("%d triangle(s) cannot be rendered because they have fewer than 3 distinct vertices."
+                      % np.count_nonzero(skipped))
+    if np.any(point):
+        warnings.warn("All vertices of %d triangle(s) have the same 2D coordinates, rendering single pixels."
+                      % np.count_nonzero(point))
+
+    if stats is not None:
+        stats.count("triangles_submitted", len(faces))
+        stats.count("degenerate_skipped", np.count_nonzero(skipped))
+        img = stats.trace(img)
+
+    with timed(stats, "shading"):
+        sorted_triangles = [triangle for triangle in sorted_triangles if not skipped[triangle]]
+
+        if engine == "bulk":
+            img = flats_bulk(img, verts2d, faces, vcolors, sorted_triangles, depth, zbuffer)
+        else:
+            filled = [triangle for triangle in sorted_triangles if not point[triangle]]
 
-    # compute the average depth of each triangle
-    triangle_depth = depth[faces].mean(axis=1)  # Kx1
+            # the scanning of all the filled triangles is prepared at once
+            if engine == "scanline":
+                setups = iter(triangle_setup(np.asarray(verts2d)[np.asarray(faces)[filled]]))
+            else:
+                setups = iter([None] * len(filled))
 
-    # sort the triangles by depth in descending order
-    sorted_triangles = triangle_depth.argsort()[::-1].tolist()  # Kx1
+            # consecutive single pixel triangles are drawn together, before the next filled triangle covers them
+            points = []
+            for triangle in sorted_triangles + [None]:
+                if triangle is not None and point[triangle]:
+                    points.append(triangle)
+                    continue
+
+                if points:
+                    img = shade_points(img, verts2d, faces, vcolors, depth, points, zbuffer)
+                    points = []
+
+                if triangle is not None:
+                    indices = faces[triangle]
+                    triangle_vertices = np.array(verts2d[indices])
+                    triangle_vcolors = np.array(vcolors[indices])
+                    img = shade_triangle(img, triangle_vertices, triangle_vcolors, shade_t, engine, depth[indices],
+                                         zbuffer, next(setups))
+
+    if stats is not None:
+        img = stats.untrace(img)
 
-    for triangle in sorted_triangles:
-        indices = faces[triangle]
-        triangle_vertices = np.array(verts2d[indices])
-        triangle_vcolors = np.array(vcolors[indices])
-        img = shade_triangle(img, triangle_vertices, triangle_vcolors, shade_t)
     return img
 
 
@@ -69,15 +173,56 @@ def rasterize(p2d, rows, cols, H, W):
     width = cols / W
     height = rows / H
 
-    # Iterate over each projected 2D coordinate and map it to the corresponding pixel position
-    for i in range(p2d.shape[1]):
-        n2d[i, 0] = np.around((p2d[0, i] + H / 2) * height + 0.5)
-        n2d[i, 1] = np.around((-p2d[1, i] + W / 2) * width + 0.5)
+    # Map all the projected 2D coordinates to their pixel positions at once
+    n2d[:, 0] = np.around((p2d[0] + H / 2) * height + 0.5)
+    n2d[:, 1] = np.around((-p2d[1] + W / 2) * width + 0.5)
 
     return n2d
 
 
-def render_object(p3d, faces, vcolors, H, W, rows, cols, f, cv, ck, cup):
+def project_to_pixels(p3d, H, W, rows, cols, f, cv, ck, cup, out=None, dtype=None):
+    # Fused kernel of camera_looking_at and rasterize: maps the 3D points straight to integer pixel coordinates and
+    # depth with whole array operations (view transform, perspective divide, viewport mapping and rounding).
+    # - p3d, H, W, rows, cols, f, cv, ck, cup: as in render_object
+    # - out: optional preallocated N_v × 2 integer matrix that receives the pixel coordinates
+    # - dtype: the floating point type of the transform (see PRECISIONS), float32 also giving 32-bit pixel indices;
+    # None keeps the type of the camera vectors
+    # - verts2d: N_v × 2 integer matrix with the pixel coordinates of each vertex (out, if given)
+    # - depth: 1 × N_v vector with the depth of each vertex
+
+    # View transform, the same change of coordinate system as in pin_hole
+    cv, ck, cup = cv.T[0], ck.T[0], cup.T[0]
+    cx, cy, cz = camera_axes(cv, ck, cup)
+    R = np.column_stack((cx, cy, cz))
+    if dtype is not None:
+        R = R.astype(dtype)
+    p3d_cam = np.dot(R.T, p3d - np.dot(R, cv).astype(R.dtype)[:, np.newaxis])
+
+    if out is None:
+        out = np.empty((p3d.shape[1], 2), dtype=np.int32 if dtype == np.float32 else int)
+
+    # Perspective divide, then the viewport mapping of rasterize, in place on the projected coordinates
+    p2d = f * p3d_cam[:2]
+    p2d /= p3d_cam[2]
+
+    p2d[0] += H / 2
+    p2d[0] *= rows / H
+    p2d[0] += 0.5
+
+    np.negative(p2d[1], out=p2d[1])
+    p2d[1] += W / 2
+    p2d[1] *= cols / W
+    p2d[1] += 0.5
+
+    np.around(p2d, out=p2d)
+    out[:, 0] = p2d[0]
+    out[:, 1] = p2d[1]
+
+    return out, p3d_cam[2]
+
+
+def render_object(p3d, faces, vcolors, H, W, rows, cols, f, cv, ck, cup, engine="scanline",
+                  visibility="painter", precision=None, stats=None):
 
     # Renders the 3D object onto the 2D plane.
     # - p3d: 3*N numpy array with the 3D coordinates of points in the WCS
@@ -92,11 +237,22 @@ def render_object(p3d, faces, vcolors, H, W, rows, cols, f, cv, ck, cup):
     # - cv: 3*1 numpy array with the 3D coordinates of the pinhole camera's center with respect to the WCS' s origin
     # - ck: 3*1 numpy array with the 3D coordinates of the target point K of the camera
     # - cup: the unit up-vector
+    # - engine: string {"scanline", "halfspace"} deciding the triangle filling engine (see render)
+    # - visibility: string {"painter", "zbuffer"} deciding how hidden points are removed (see render)
+    # - precision: string {"double", "single", "half", "compact"} deciding the types of the geometry, the indices
+    # and the canvas (see render)
+    # - stats: optional RenderStats that records the time of the projection ("projection") and the statistics of
+    # render
     # - img: image with the rendered object
 
-    p2d, depth = camera_looking_at(f, cv, ck, cup, p3d)
-    n2d = rasterize(p2d, rows, cols, H, W).astype(int)
+    float_type = None
+    if precision is not None:
+        float_type = PRECISIONS[precision][0]
+        p3d = np.asarray(p3d, dtype=float_type)
+
+    with timed(stats, "projection"):
+        n2d, depth = project_to_pixels(p3d, H, W, rows, cols, f, cv, ck, cup, dtype=float_type)
 
-    img = render(n2d, faces, vcolors, depth, "gouraud")
+    img = render(n2d, faces, vcolors, depth, "gouraud", engine, visibility, precision, stats)
 
     return img
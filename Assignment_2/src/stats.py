@@ -0,0 +1,123 @@
+import time
+from contextlib import contextmanager
+import numpy as np
+
+# Opt-in instrumentation of the renderers: a RenderStats object passed as their stats argument collects the wall time
+# of every stage, the counts of the triangles and pixels, and a heatmap of how many times each pixel was written.
+# Each measurement is also passed to the hooks of the object as it is recorded, so it can be forwarded to a metrics
+# system:
+#
+#   stats = RenderStats(hooks=[lambda kind, name, value: print(kind, name, value)])
+#   img = render_object(..., stats=stats)
+#   write_image("overdraw.png", stats.heatmap_image())
+
+# the counts of a render: the triangles given to it, the ones removed as degenerate, as back faces or by the bvh, the
+# ones left after clipping (which splits the triangles that cross the near and far planes into pieces), the pixel
+# writes to the canvas and the points lit; the points lit follow what each shader lights (every written point for
+# phong and deferred shading; for gouraud the 3 vertices of every shaded triangle, with the halfspace engine of every
+# one that covers a pixel, or each vertex once with vertex_lighting), counted once however many outputs are drawn
+COUNTS = ["triangles_submitted", "degenerate_skipped", "culled_backfaces", "bvh_rejected", "triangles_after_clip",
+          "pixels_written", "light_evaluations"]
+
+
+class TracedCanvas(np.ndarray):
+    # view of a canvas that counts the writes to each of its pixels in the overdraw matrix of a RenderStats, and their
+    # total in its pixels_written, before storing them; the triangle filling functions write to it as to any canvas.
+    # The pixels of a write are the row and column parts of its key (integers, slices, index arrays or an MxN mask),
+    # whatever channels it writes; keys of other forms (e.g. with an ellipsis) are counted approximately or not at all
+
+    def __array_finalize__(self, obj):
+        # views taken from a traced canvas (e.g. its rows) are not traced themselves
+        self.stats = None
+
+    def __setitem__(self, key, value):
+        if self.stats is not None:
+            pixels = key[:2] if isinstance(key, tuple) else key
+            np.add.at(self.stats.overdraw, pixels, 1)
+            self.stats.counts["pixels_written"] += np.size(self.stats.overdraw[pixels])
+        super().__setitem__(key, value)
+
+
+class RenderStats:
+    # statistics of one or more renders
+    # times: dictionary with the wall time in seconds spent in each stage
+    # counts: dictionary with the counts of COUNTS
+    # overdraw: MxN matrix with the number of times each pixel was written (None before a render)
+    # hooks: list of functions called as hook(kind, name, value) with kind "time" or "count" for every measurement
+    # (the pixels written to a traced canvas are passed once, when it is untraced)
+
+    def __init__(self, hooks=None):
+        self.times = {}
+        self.counts = dict.fromkeys(COUNTS, 0)
+        self.overdraw = None
+        self.traced_writes = 0
+        self.hooks = list(hooks) if hooks is not None else []
+
+    def __getitem__(self, name):
+        return self.counts[name]
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def add_time(self, stage, seconds):
+        self.times[stage] = self.times.get(stage, 0) + seconds
+        for hook in self.hooks:
+            hook("time", stage, seconds)
+
+    def count(self, name, value=1):
+        self.counts[name] += int(value)
+        for hook in self.hooks:
+            hook("count", name, int(value))
+
+    def trace(self, canvas):
+        # starts counting the writes to a canvas
+        # - canvas: MxNx3 image that is about to be drawn on
+        # - traced: a TracedCanvas view of it
+
+        if self.overdraw is None or self.overdraw.shape != canvas.shape[:2]:
+            self.overdraw = np.zeros(canvas.shape[:2], dtype=np.int64)
+
+        self.traced_writes = self.counts["pixels_written"]
+        traced = canvas.view(TracedCanvas)
+        traced.stats = self
+        return traced
+
+    def untrace(self, traced):
+        # stops counting the writes to a traced canvas and passes their number to the hooks
+        # - traced: a TracedCanvas of trace
+        # - canvas: the plain array it views
+
+        for hook in self.hooks:
+            hook("count", "pixels_written", self.counts["pixels_written"] - self.traced_writes)
+        return traced.view(np.ndarray)
+
+    def overdraw_factor(self):
+        # the mean number of writes to the pixels that were written at least once
+        covered = np.count_nonzero(self.overdraw) if self.overdraw is not None else 0
+        return float(self.counts["pixels_written"] / covered) if covered else 0.0
+
+    def heatmap_image(self):
+        # colors the overdraw of each pixel from black (never written) through red and yellow to white (the most
+        # written pixel), as an MxNx3 image with values in [0, 1]
+
+        t = self.overdraw / max(self.overdraw.max(), 1)
+        return np.clip(np.stack((3 * t, 3 * t - 1, 3 * t - 2), axis=-1), 0, 1)
+
+    def as_dict(self):
+        # the statistics as a dictionary of plain python values (e.g. for json)
+        return {"times": dict(self.times), "counts": dict(self.counts), "overdraw_factor": self.overdraw_factor()}
+
+
+@contextmanager
+def timed(stats, stage):
+    # times the code of a with block as a stage of stats; does nothing if stats is None
+    if stats is None:
+        yield
+        return
+
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_time(stage, time.perf_counter() - start_time)
+
@@ -73,3 +73,30 @@ def change_coordinate_system(cp, R, c0):
         dp = np.dot(R.T, v)
 
     return dp
+
+
+def rotate_translate_matrix(theta, u, A, t):
+    # Calculates the 4*4 homogeneous matrix of rotate_translate: a rotation of an angle theta around an axis that
+    # passes through A and is parallel to the unit vector u, followed by a translation by t.
+    # - theta, u, A, t: as in rotate_translate
+    # - T: 4*4 matrix such that T @ [cp; 1] = [cq; 1]
+
+    R = rotmat(theta, u)
+
+    T = np.eye(4)
+    T[:3, :3] = R
+    T[:3, 3] = np.asarray(A) - np.dot(R, A) + np.asarray(t)
+
+    return T
+
+
+def compose(*transforms):
+    # Composes 4*4 homogeneous matrices into one that applies them in the given order (the first one first).
+    # - transforms: 4*4 matrices
+    # - T: 4*4 matrix of the composed transformation
+
+    T = np.eye(4)
+    for transform in transforms:
+        T = np.dot(transform, T)
+
+    return T
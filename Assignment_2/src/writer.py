@@ -0,0 +1,97 @@
+import struct
+import zlib
+import numpy as np
+
+
+def quantize(img, in_place=False):
+    # converts an image with values in [0, 1] to 8-bit levels; uint8 images (e.g. rendered with the "compact"
+    # precision) are returned as they are
+    # - img: MxNx3 (or MxN) image
+    # - in_place: if True, the clipping and scaling are done in the memory of img, which is overwritten, instead of
+    # a temporary copy
+    # - img8: MxNx3 (or MxN) uint8 image
+
+    if img.dtype == np.uint8:
+        return img
+
+    levels = img if in_place else np.array(img, dtype=np.result_type(img.dtype, np.float32))
+    np.clip(levels, 0, 1, out=levels)
+    levels *= 255
+    np.rint(levels, out=levels)
+
+    return levels.astype(np.uint8)
+
+
+def png_chunk(kind, data):
+    # packs a PNG chunk: its length, type, data and CRC
+    # - kind: the 4-byte type of the chunk (e.g. b"IHDR")
+    # - data: the bytes of the chunk
+
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def write_png(f, img8, flip=False, level=6):
+    # writes an 8-bit RGB (MxNx3) or grayscale (MxN) image as a PNG file
+    # - f: file opened for binary writing
+    # - img8: uint8 image
+    # - flip: if True, the rows are written from the last to the first (the image indexing starts from down to up)
+    # - level: zlib compression level, from 0 (none, fastest) to 9 (smallest file)
+
+    M, N = img8.shape[:2]
+    channels = 1 if img8.ndim == 2 else img8.shape[2]
+    assert channels in [1, 3]
+
+    # every scanline starts with its filter type (0: none); the rows are copied once, already in the written order
+    raw = np.empty((M, 1 + N * channels), dtype=np.uint8)
+    raw[:, 0] = 0
+    raw[:, 1:] = (img8[::-1] if flip else img8).reshape(M, N * channels)
+
+    f.write(b"\x89PNG\r\n\x1a\n")
+    f.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", N, M, 8, 0 if channels == 1 else 2, 0, 0, 0)))
+    f.write(png_chunk(b"IDAT", zlib.compress(raw.data, level)))
+    f.write(png_chunk(b"IEND", b""))
+
+
+def write_raw(f, img8, flip=False):
+    # writes the bytes of an 8-bit image row by row, without any header
+    # - f: file opened for binary writing
+    # - img8: uint8 image
+    # - flip: as in write_png
+
+    img8 = np.ascontiguousarray(img8)
+    for row in (img8[::-1] if flip else img8):
+        f.write(row.data)
+
+
+def write_ppm(f, img8, flip=False):
+    # writes an 8-bit RGB image as a binary PPM (P6) file
+    # - f: file opened for binary writing
+    # - img8: MxNx3 uint8 image
+    # - flip: as in write_png
+
+    M, N = img8.shape[:2]
+    f.write(b"P6\n%d %d\n255\n" % (N, M))
+    write_raw(f, img8, flip)
+
+
+def write_image(path, img, flip=False, level=6, in_place=False):
+    # writes a rendered image to a file, whose format is chosen by its extension: ".png", ".ppm", or ".rgb"/".raw"
+    # for the bare RGB bytes
+    # - path: the name of the file
+    # - img: MxNx3 image with values in [0, 1], or a uint8 image
+    # - flip: if True, the image is written upside down, for images whose indexing starts from down to up
+    # - level: zlib compression level of PNG files, from 0 to 9
+    # - in_place: if True, a floating point img is overwritten while it is quantized, saving a copy (see quantize)
+
+    extension = path.rsplit(".", 1)[-1].lower()
+    assert extension in ["png", "ppm", "rgb", "raw"]
+
+    img8 = quantize(img, in_place)
+
+    with open(path, "wb") as f:
+        if extension == "png":
+            write_png(f, img8, flip, level)
+        elif extension == "ppm":
+            write_ppm(f, img8, flip)
+        else:
+            write_raw(f, img8, flip)
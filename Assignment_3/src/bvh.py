@@ -0,0 +1,188 @@
+from projection import *
+from helpers import *
+
+
+class FaceBVH:
+    # bounding volume hierarchy over the triangles of a mesh, built once and refitted when the vertices move (e.g. by
+    # rotate_translate), so that frustum and back-facing culling reject whole groups of triangles at once.
+    # Every node stores the bounding box of its triangles and a cone that contains all their normals; the nodes are
+    # numbered level by level and every one covers a contiguous range of order.
+    # faces: N_t × 3 matrix with the indices of the vertices of each triangle
+    # leaf_size: maximum number of triangles in a leaf
+    # order: the indices of the triangles arranged by node
+    # left, right: the indices of the children of each node (-1 for leaves)
+    # start, count: the range of order covered by each node
+    # level: the depth of each node in the tree
+    # lo, hi: K × 3 matrices with the lower and upper corner of the bounding box of each node
+    # axis, angle: K × 3 matrix and K vector; the normals of the triangles of a node are within angle of its axis
+
+    def __init__(self, verts, faces, leaf_size=32):
+        self.faces = np.asarray(faces)
+        self.leaf_size = leaf_size
+        self.order = np.arange(len(self.faces))
+
+        centroids = np.mean(verts[:, self.faces], axis=2).T
+
+        # split the nodes breadth first at the median of the centroids along the longest side of their box
+        left, right, start, count, level = [], [], [0], [len(self.faces)], [0]
+        i = 0
+        while i < len(start):
+            s, c = start[i], count[i]
+            if c <= leaf_size:
+                left.append(-1)
+                right.append(-1)
+            else:
+                members = self.order[s:s + c]
+                points = centroids[members]
+                dim = np.argmax(points.max(axis=0) - points.min(axis=0))
+                half = c // 2
+                self.order[s:s + c] = members[np.argpartition(points[:, dim], half)]
+
+                left.append(len(start))
+                right.append(len(start) + 1)
+                start += [s, s + half]
+                count += [half, c - half]
+                level += [level[i] + 1] * 2
+            i += 1
+
+        self.left = np.array(left)
+        self.right = np.array(right)
+        self.start = np.array(start)
+        self.count = np.array(count)
+        self.level = np.array(level)
+
+        self.refit(verts)
+
+    def refit(self, verts):
+        # recomputes the bounding boxes and normal cones of the nodes for new positions of the vertices, keeping the
+        # structure of the tree
+        # - verts: 3 × N_v matrix with the coordinates of the vertices of the object
+
+        points = verts[:, self.faces[self.order]]
+        face_lo = points.min(axis=2).T
+        face_hi = points.max(axis=2).T
+        face_normals = normalize_columns(np.cross(points[:, :, 1] - points[:, :, 0],
+                                                  points[:, :, 2] - points[:, :, 0], axis=0)).T
+
+        num_nodes = len(self.left)
+        self.lo = np.empty((num_nodes, 3))
+        self.hi = np.empty((num_nodes, 3))
+        self.axis = np.empty((num_nodes, 3))
+        self.angle = np.empty(num_nodes)
+
+        # a mesh without triangles has a single, empty leaf that is never visited
+        if len(self.faces) == 0:
+            self.lo[:], self.hi[:], self.axis[:], self.angle[:] = 0, 0, 0, np.pi
+            return
+
+        # the leaves cover consecutive ranges of order, so they are reduced all at once
+        leaves = np.flatnonzero(self.left < 0)
+        leaves = leaves[np.argsort(self.start[leaves])]
+        starts = self.start[leaves]
+        self.lo[leaves] = np.minimum.reduceat(face_lo, starts)
+        self.hi[leaves] = np.maximum.reduceat(face_hi, starts)
+
+        axis = normalize_columns(np.add.reduceat(face_normals, starts).T).T
+        cosines = np.sum(face_normals * np.repeat(axis, self.count[leaves], axis=0), axis=1)
+        self.axis[leaves] = axis
+        self.angle[leaves] = np.arccos(np.clip(np.minimum.reduceat(cosines, starts), -1, 1))
+
+        # then every level of internal nodes encloses the boxes and the cones of its children
+        for L in range(self.level.max() - 1, -1, -1):
+            nodes = np.flatnonzero((self.level == L) & (self.left >= 0))
+            l, r = self.left[nodes], self.right[nodes]
+            self.lo[nodes] = np.minimum(self.lo[l], self.lo[r])
+            self.hi[nodes] = np.maximum(self.hi[l], self.hi[r])
+
+            axis = normalize_columns((self.axis[l] + self.axis[r]).T).T
+            spread_l = np.arccos(np.clip(np.sum(axis * self.axis[l], axis=1), -1, 1)) + self.angle[l]
+            spread_r = np.arccos(np.clip(np.sum(axis * self.axis[r], axis=1), -1, 1)) + self.angle[r]
+            self.axis[nodes] = axis
+            self.angle[nodes] = np.minimum(np.maximum(spread_l, spread_r), np.pi)
+
+        # a cone without an axis may hold normals in every direction
+        self.angle[~self.axis.any(axis=1)] = np.pi
+
+    def visible_faces(self, focal, eye, lookat, up, M, N, H, W, near, far=np.inf, cull=False):
+        # walks the hierarchy one level at a time and collects the triangles of the leaves that were not rejected
+        # - focal, eye, lookat, up, M, N, H, W: as in render_object
+        # - near, far: the depths of the near and far planes
+        # - cull: if True, the nodes whose triangles all face away from the camera are rejected as well
+        # - faces: the indices of the triangles that may be visible
+
+        if len(self.faces) == 0:
+            return np.empty(0, dtype=int)
+
+        normals, offsets = frustum_planes(focal, eye, lookat, up, M, N, H, W, near, far)
+        # the planes are the near one, the four sides of the image and perhaps the far one
+        sides = np.zeros(len(normals), dtype=bool)
+        sides[1:5] = True
+
+        # the plane of the eye; the points behind it are projected mirrored, so the planes of the sides of the image
+        # only reject the boxes that are entirely in front of it
+        eye_normals, eye_offsets = frustum_planes(focal, eye, lookat, up, M, N, H, W, 0)
+        eye = np.ravel(eye)
+
+        nodes = np.array([0])
+        leaves = []
+        while len(nodes):
+            center = (self.lo[nodes] + self.hi[nodes]) / 2
+            extent = (self.hi[nodes] - self.lo[nodes]) / 2
+
+            # a box is outside the frustum if it lies entirely on the outer side of one of its planes
+            outside = center @ normals.T - extent @ np.abs(normals).T + offsets > 0
+            in_front = center @ eye_normals[0] + extent @ np.abs(eye_normals[0]) + eye_offsets[0] < 0
+            keep = ~np.any(outside[:, ~sides], axis=1) & ~(np.any(outside[:, sides], axis=1) & in_front)
+
+            if cull:
+                # the directions from the box (within its bounding sphere) to the eye form a cone; the triangles all
+                # face away if it is more than a right angle away from every normal of the node
+                radius = np.linalg.norm(extent, axis=1)
+                view = eye - center
+                distance = np.linalg.norm(view, axis=1)
+                far_enough = distance > radius
+                spread = np.arcsin(np.clip(radius / np.where(far_enough, distance, 1), 0, 1))
+                between = np.arccos(np.clip(np.sum(self.axis[nodes] * view, axis=1) /
+                                            np.where(far_enough, distance, 1), -1, 1))
+                keep &= ~(far_enough & (between > np.pi / 2 + self.angle[nodes] + spread))
+
+            nodes = nodes[keep]
+            is_leaf = self.left[nodes] < 0
+            leaves.append(nodes[is_leaf])
+            nodes = np.concatenate((self.left[nodes[~is_leaf]], self.right[nodes[~is_leaf]]))
+
+        leaves = np.concatenate(leaves)
+        if len(leaves) == 0:
+            return np.empty(0, dtype=int)
+
+        return np.concatenate([self.order[s:s + c] for s, c in zip(self.start[leaves], self.count[leaves])])
+
+
+def frustum_planes(focal, eye, lookat, up, M, N, H, W, near, far=np.inf):
+    # calculates the planes that bound the part of the world that is projected onto the pixels of the image (with a
+    # margin of a pixel for the rounding) between the near and far planes
+    # - focal, eye, lookat, up, M, N, H, W: as in render_object
+    # - near, far: the depths of the near and far planes (no far plane if inf)
+    # - normals, offsets: P × 3 matrix and P vector; a point p is inside when normals @ p + offsets <= 0
+
+    f = focal
+
+    # bounds of the projected coordinates that are mapped onto the columns and (negated) onto the rows of the image
+    a0, b0 = -H / 2 - H / M, N * H / M - H / 2
+    a1, b1 = -W / 2 - W / N, M * W / N - W / 2
+
+    # the planes in the camera coordinate system, where the visible points have negative z
+    normals = [[0, 0, 1], [f, 0, -a0], [-f, 0, b0], [0, -f, -a1], [0, f, b1]]
+    offsets = [near, 0, 0, 0, 0]
+    if np.isfinite(far):
+        normals.append([0, 0, -1])
+        offsets.append(-far)
+    normals = np.array(normals, dtype=float)
+    offsets = np.array(offsets, dtype=float)
+
+    # the same change of coordinate system as in project_to_pixels: q = R.T @ p - t
+    cx, cy, cz = camera_axes(eye, lookat, up)
+    R = np.column_stack((cx, cy, cz))
+    t = np.dot(R.T, np.dot(R, np.ravel(eye)))
+
+    return normals @ R.T, offsets - normals @ t
@@ -0,0 +1,91 @@
+import hashlib
+from collections import OrderedDict
+from render import *
+
+
+def content_hash(*arrays):
+    # hashes the contents (values, type and shape) of some arrays
+    # - arrays: numpy arrays
+    # - digest: hexadecimal string that changes whenever any of the arrays does
+
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(str((a.dtype.str, a.shape)).encode())
+        h.update(a.data)
+
+    return h.hexdigest()
+
+
+class GeometryCache:
+    # memoizes the geometry stage of render_object (normals, projection onto the pixels and drawing order), so that
+    # rendering the same mesh again from the same camera (e.g. with another lighting) does not redo that work.
+    # Entries are keyed by a content hash of verts/faces and the camera parameters and the least recently used ones
+    # are evicted to keep the cache within its bounds.
+    # max_entries: maximum number of cached results
+    # max_bytes: maximum total size in bytes of the cached arrays (None for no limit)
+    # hits, misses: number of lookups that found / did not find their result in the cache
+
+    def __init__(self, max_entries=64, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def lookup(self, key, compute):
+        # returns the cached result for key, or computes it with compute() and caches it
+        # - key: hashable key of the result
+        # - compute: function without arguments returning an array or a tuple of arrays
+        # - value: the (read-only) result
+
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+        self.misses += 1
+        value = compute()
+
+        arrays = value if isinstance(value, tuple) else (value,)
+        nbytes = sum(a.nbytes for a in arrays)
+        for a in arrays:
+            a.flags.writeable = False
+
+        self.entries[key] = (value, nbytes)
+        self.nbytes += nbytes
+
+        # evict the least recently used entries, but never the one that was just added
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries or
+                                         (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.nbytes -= evicted
+
+        return value
+
+    def geometry(self, focal, eye, lookat, up, M, N, H, W, verts, faces, visibility, dtype=None):
+        # cached version of project_object and paint_order (the arguments are those of render_object and dtype that
+        # of project_object)
+        # - normals, verts2d, depth: as in project_object
+        # - sorted_triangles: as in paint_order
+
+        mesh = content_hash(verts, faces)
+        camera = tuple(float(v) for v in np.concatenate([np.ravel(eye), np.ravel(lookat), np.ravel(up),
+                                                         [focal, H, W]])) + (int(M), int(N))
+
+        normals = self.lookup(("normals", mesh, str(dtype)),
+                              lambda: calculate_normals(verts, faces.T, dtype=float if dtype is None else dtype))
+        verts2d, depth = self.lookup(("projection", mesh, camera, str(dtype)),
+                                     lambda: project_to_pixels(focal, eye, lookat, up, M, N, H, W, verts, dtype=dtype))
+        sorted_triangles = self.lookup(("order", mesh, camera, visibility, str(dtype)),
+                                       lambda: paint_order(depth, faces, visibility).copy())
+
+        return normals, verts2d, depth, sorted_triangles
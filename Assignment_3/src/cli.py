@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from cache import *
+from writer import *
+from scene import *
+
+# Renders the images listed in a JSON manifest without a script per image:
+#
+#   python cli.py manifest.json
+#
+# {"defaults": {"scene": "h3.npy", "engine": "halfspace"},
+#  "renders": [{"shader": "gouraud", "lighting": "full", "output": "gouraud.png"},
+#              {"shader": "phong", "lighting": "specular", "output": "specular.png", "camera": {"focal": 100}}]}
+#
+# Every render takes the keys of "defaults" that it does not set itself. Relative paths are relative to the manifest.
+# Each scene is loaded once, the renders share a GeometryCache, and renders that differ only in their lighting and
+# output are drawn in a single pass (with the "halfspace" engine or deferred shading).
+
+# options of render_object that a render may set, with their defaults
+OPTIONS = {"shader": "phong", "engine": "halfspace", "visibility": "painter", "deferred": False, "cull": False,
+           "clip": False, "precision": None, "vertex_lighting": False}
+
+# parameters of the scene that a render may override with its "camera"
+CAMERA = ["focal", "eye", "lookat", "up", "M", "N", "H", "W"]
+
+
+def load_scene(path):
+    # opens a scene with the arrays of h3.npy (a scene directory or the .npy file, see open_scene) and converts it
+    # to the arguments of render_object
+    # - path: the directory of the scene or the name of the .npy file
+    # - scene: dictionary with the arguments of render_object that describe the scene (focal ... light_amb)
+
+    data = open_scene(path)
+
+    mat = PhongMaterial(data['ka'], data['kd'], data['ks'], data['n'])
+    lights = [PointLight(np.array([position]), np.array([intensity]))
+              for position, intensity in zip(data['light_positions'], data['light_intensities'])]
+
+    return {"focal": data['focal'], "eye": data['cam_eye'], "lookat": data['cam_lookat'], "up": data['cam_up'],
+            "bg_color": data['bg_color'].T[0], "M": data['M'], "N": data['N'], "H": data['H'], "W": data['W'],
+            "verts": data['verts'], "vert_colors": data['vert_colors'], "faces": data['faces'],
+            "mat": mat, "lights": lights, "light_amb": data['Ia'].T[0]}
+
+
+def group_renders(manifest, base="."):
+    # gathers the renders of a manifest that share their scene, camera and options, so that all their lighting
+    # outputs come from one pass
+    # - manifest: the parsed manifest
+    # - base: the directory that relative paths refer to
+    # - groups: ordered dictionary that maps (scene path, options, camera) to the list of (lighting, output, flip) of
+    # the renders of the group
+
+    defaults = manifest.get("defaults", {})
+    groups = OrderedDict()
+
+    for render in manifest["renders"]:
+        render = dict(defaults, **render)
+
+        unknown = set(render) - set(OPTIONS) - {"scene", "camera", "lighting", "output", "flip"}
+        assert not unknown, "unknown keys in render: %s" % sorted(unknown)
+        assert set(render.get("camera", {})) <= set(CAMERA)
+
+        options = tuple((key, render.get(key, default)) for key, default in OPTIONS.items())
+        camera = tuple(sorted((key, json.dumps(value)) for key, value in render.get("camera", {}).items()))
+        scene = os.path.join(base, render["scene"])
+
+        key = (scene, options, camera)
+        if not (dict(options)["engine"] == "halfspace" or dict(options)["deferred"]):
+            # the scanline engine draws a single lighting output per pass
+            key += (render["lighting"],)
+
+        groups.setdefault(key, []).append((render["lighting"], os.path.join(base, render["output"]),
+                                           render.get("flip", True)))
+
+    return groups
+
+
+def run(manifest, base=".", log=None):
+    # renders and writes all the images of a manifest
+    # - manifest: the parsed manifest
+    # - base: the directory that relative paths refer to
+    # - log: optional function called with a line of progress after every group
+    # - count: the number of images written
+
+    scenes = {}
+    cache = GeometryCache()
+    count = 0
+
+    for key, renders in group_renders(manifest, base).items():
+        scene_path, options, camera = key[:3]
+        start_time = time.time()
+
+        if scene_path not in scenes:
+            scenes[scene_path] = load_scene(scene_path)
+        scene = dict(scenes[scene_path])
+        for name, value in camera:
+            scene[name] = np.array(json.loads(value)) if name in ["eye", "lookat", "up"] else json.loads(value)
+
+        outputs = list(OrderedDict.fromkeys(lighting for lighting, _, _ in renders))
+        lighting = outputs if len(key) == 3 else outputs[0]
+        images = render_object(lighting=lighting, cache=cache, **scene, **dict(options))
+        if isinstance(lighting, str):
+            images = {lighting: images}
+
+        for lighting, path, flip in renders:
+            write_image(path, images[lighting], flip=flip)
+        count += len(renders)
+
+        if log is not None:
+            log("%s: %d image(s) in %.2f sec" % (os.path.basename(scene_path), len(renders), time.time() - start_time))
+
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Renders the images listed in a JSON manifest.")
+    parser.add_argument("manifest", help="the manifest file, or - to read it from the standard input")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not report the progress")
+    args = parser.parse_args(argv)
+
+    if args.manifest == "-":
+        manifest, base = json.load(sys.stdin), "."
+    else:
+        with open(args.manifest) as f:
+            manifest = json.load(f)
+        base = os.path.dirname(os.path.abspath(args.manifest))
+
+    log = None if args.quiet else (lambda line: print(line, file=sys.stderr))
+
+    start_time = time.time()
+    count = run(manifest, base, log)
+    if log is not None:
+        log("%d image(s) rendered in %.2f sec" % (count, time.time() - start_time))
+
+
+if __name__ == "__main__":
+    main()
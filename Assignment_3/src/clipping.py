@@ -0,0 +1,87 @@
+from helpers import *
+
+
+def clip_plane(attributes, faces, distance):
+    # clips all the triangles at once against a plane (one step of Sutherland-Hodgman): the part of a triangle on the
+    # outer side of the plane is cut off and what remains (a triangle or a quadrilateral) is split into triangles
+    # whose new vertices lie on the plane
+    # - attributes: K × N_v matrix with the attributes of each vertex (coordinates, normal, color, depth), linearly
+    # interpolated along the edges for the new vertices
+    # - faces: N_t × 3 matrix with the indices of the vertices of each triangle
+    # - distance: 1 × N_v vector with the signed distance of each vertex from the plane, positive on the inner side
+    # - attributes: the input attributes with the ones of the new vertices appended
+    # - faces: the triangles that lie entirely on the inner side, with the same winding as the ones they came from
+
+    inside = distance[faces] >= 0
+    count = inside.sum(axis=1)
+    kept = faces[count == 3]
+
+    split = (count == 1) | (count == 2)
+    if not split.any():
+        return attributes, kept
+
+    # roll the vertices of the cut triangles so that the lone one (the inner vertex if only one is inside, the outer
+    # vertex if two are) comes first; rolling keeps the winding
+    lone = inside[split] ^ (count[split] == 2)[:, np.newaxis]
+    first = np.argmax(lone, axis=1)
+    rolled = faces[split][np.arange(len(first))[:, np.newaxis], (first[:, np.newaxis] + np.arange(3)) % 3]
+    a, b, c = rolled.T
+
+    # the new vertices where the edges a-b and a-c cross the plane
+    d_a, d_b, d_c = distance[a], distance[b], distance[c]
+    new_ab = attributes[:, a] + d_a / (d_a - d_b) * (attributes[:, b] - attributes[:, a])
+    new_ac = attributes[:, a] + d_a / (d_a - d_c) * (attributes[:, c] - attributes[:, a])
+
+    num_verts = attributes.shape[1]
+    ab = num_verts + np.arange(len(a))
+    ac = ab + len(a)
+
+    # one inner vertex: the triangle shrinks to the part next to it; two inner vertices: the remaining
+    # quadrilateral ab, b, c, ac is split in two triangles
+    one = count[split] == 1
+    two = ~one
+    faces = np.concatenate((kept,
+                            np.column_stack((a[one], ab[one], ac[one])),
+                            np.column_stack((ab[two], b[two], c[two])),
+                            np.column_stack((ab[two], c[two], ac[two]))))
+
+    return np.hstack((attributes, new_ab, new_ac)), faces
+
+
+def clip_depth(verts, normals, vert_colors, depth, faces, near, far):
+    # discards the triangles that lie entirely in front of the near plane or behind the far plane and clips the ones
+    # that cross them, so that every vertex that reaches the projection is between the two planes
+    # - verts: 3 × N_v matrix with the coordinates of the vertices of the object
+    # - normals: 3 × N_v matrix with the normal vector of each vertex
+    # - vert_colors: N_v × 3 matrix with the color of each vertex
+    # - depth: 1 × N_v vector with the depth of each vertex
+    # - faces: N_t × 3 matrix with the indices of the vertices of each triangle
+    # - near, far: the depths of the near and far planes (far may be inf)
+    # - verts, normals, vert_colors: the input ones with the new vertices on the planes appended
+    # - faces: the triangles between the planes
+
+    attributes = np.vstack((verts, normals, vert_colors.T, depth))
+
+    attributes, faces = clip_plane(attributes, faces, attributes[-1] - near)
+    if np.isfinite(far):
+        attributes, faces = clip_plane(attributes, faces, far - attributes[-1])
+
+    # the interpolated normals of the new vertices are no longer unit vectors
+    num_verts = verts.shape[1]
+    normals = np.hstack((normals, normalize_columns(attributes[3:6, num_verts:], normals.dtype)))
+
+    return attributes[:3].astype(verts.dtype), normals, attributes[6:9].T.astype(vert_colors.dtype), faces
+
+
+def on_screen(verts2d, faces, M, N):
+    # finds the triangles that may cover pixels of the image, i.e. those that do not lie entirely beyond one of its
+    # borders
+    # - verts2d: N_v × 2 matrix with the pixel coordinates of each vertex
+    # - faces: N_t × 3 matrix with the indices of the vertices of each triangle
+    # - M, N: height, width of the image in pixels
+    # - visible: boolean vector with N_t elements, True for the triangles that overlap the image
+
+    points = verts2d[faces]
+    x, y = points[:, :, 0], points[:, :, 1]
+
+    return (x.max(axis=1) >= 0) & (x.min(axis=1) < N) & (y.max(axis=1) >= 0) & (y.min(axis=1) < M)
@@ -0,0 +1,61 @@
+from helpers import *
+from lighting import *
+
+
+def fill_gbuffer(verts2d, normals, vert_colors, verts, depth, faces, triangles, M, N, dtype=float):
+    # rasterizes the triangles into the planes of a geometry buffer, keeping on each pixel the interpolated normal,
+    # color and depth of the nearest triangle, as well as the point used for its lighting; nothing is lit here
+    # - verts2d: N_v × 2 matrix with the pixel coordinates of each vertex
+    # - normals: 3 × N_v matrix with the normal vector of each vertex
+    # - vert_colors: N_v × 3 matrix with the color of each vertex
+    # - verts: 3 × N_v matrix with the coordinates of the vertices of the object
+    # - depth: 1 × N_v vector with the depth of each vertex
+    # - faces: N_t × 3 matrix with the indices of the vertices of each triangle
+    # - triangles: indices of the triangles to draw; drawing the nearest first saves interpolations
+    # - M, N: height, width of the image in pixels
+    # - dtype: the type of the planes (see PRECISIONS)
+    # - gbuffer: dictionary with the MxN "depth" plane (inf where nothing was drawn) and the MxNx3 "normal",
+    # "color" and "point" planes
+
+    gbuffer = {"depth": np.full((M, N), np.inf, dtype=dtype), "normal": np.zeros((M, N, 3), dtype=dtype),
+               "color": np.zeros((M, N, 3), dtype=dtype), "point": np.zeros((M, N, 3), dtype=dtype)}
+
+    for triangle in triangles:
+        triangle_vertices_indices = faces[triangle]
+        vertices = verts2d[triangle_vertices_indices]
+
+        # check if there are fewer than 3 distinct vertices and a triangle cannot be formed
+        if distinct_vertices(vertices) < 3:
+            continue
+
+        ys, xs, weights = edge_coverage(vertices, M, N)
+        ys, xs, weights = depth_filter(gbuffer["depth"], ys, xs, weights, depth[triangle_vertices_indices])
+
+        gbuffer["normal"][ys, xs] = weights @ normals[:, triangle_vertices_indices].T
+        gbuffer["color"][ys, xs] = weights @ vert_colors[triangle_vertices_indices]
+        gbuffer["point"][ys, xs] = np.mean(verts[:, triangle_vertices_indices], axis=0)
+
+    return gbuffer
+
+
+def shade_gbuffer(gbuffer, bg_color, cam_pos, mat, lights, light_amb, lighting, dtype=float):
+    # lights every covered pixel of a geometry buffer exactly once, in a single batched pass
+    # - gbuffer: the geometry buffer of fill_gbuffer
+    # - bg_color: 3 × 1 vector with the colour components of the background
+    # - cam_pos ... light_amb: as in light_batch
+    # - lighting: string {"ambient", "diffusion", "specular", "full"}, or a list of them
+    # - dtype: the type of the images (see PRECISIONS)
+    # - img: the image with the lit pixels on the background, or a dictionary with one image per lighting output
+
+    covered = np.isfinite(gbuffer["depth"])
+    outputs = [lighting] if isinstance(lighting, str) else lighting
+
+    I = light_components(gbuffer["point"][covered], gbuffer["normal"][covered], gbuffer["color"][covered],
+                         cam_pos, mat, lights, light_amb, outputs)
+
+    images = {}
+    for output in outputs:
+        images[output] = new_canvas(gbuffer["normal"].shape, bg_color, dtype)
+        images[output][covered] = canvas_color(np.clip(I[output], 0, 1), images[output])
+
+    return images[lighting] if isinstance(lighting, str) else images
@@ -1,12 +1,13 @@
-import matplotlib.pyplot as plt
 import time
 from render import *
+from writer import *
+from scene import *
 
 # Load data from file
-data = np.load('h3.npy', allow_pickle=True)[()]
+data = open_scene('h3.npy')
 verts = data['verts']
-vert_colors = data['vertex_colors'].T
-faces = data['face_indices'].T
+vert_colors = data['vert_colors']
+faces = data['faces']
 eye = data['cam_eye']
 lookat = data['cam_lookat']
 up = data['cam_up']
@@ -34,36 +35,17 @@ for i in range(num_of_lights):
 
 start_time = time.time()
 
-img = render_object("gouraud", focal, eye, lookat, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, mat, lights, Ia, "ambient")
-plt.imsave('0.jpg', np.array(img[::-1]))
+# All the lighting outputs of a shader come from a single geometry and rasterization pass
+outputs = ["ambient", "diffusion", "specular", "full"]
 
-img = render_object("gouraud", focal, eye, lookat, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, mat, lights, Ia, "diffusion")
-plt.imsave('1.jpg', np.array(img[::-1]))
+images = render_object("gouraud", focal, eye, lookat, up, bg_color, M, N, H, W,
+                       verts, vert_colors, faces, mat, lights, Ia, outputs, engine="halfspace")
+for i, lighting in enumerate(outputs):
+    write_image('%d.png' % i, images[lighting], flip=True)
 
-img = render_object("gouraud", focal, eye, lookat, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, mat, lights, Ia, "specular")
-plt.imsave('2.jpg', np.array(img[::-1]))
-
-img = render_object("gouraud", focal, eye, lookat, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, mat, lights, Ia, "full")
-plt.imsave('3.jpg', np.array(img[::-1]))
-
-img = render_object("phong", focal, eye, lookat, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, mat, lights, Ia, "ambient")
-plt.imsave('4.jpg', np.array(img[::-1]))
-
-img = render_object("phong", focal, eye, lookat, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, mat, lights, Ia, "diffusion")
-plt.imsave('5.jpg', np.array(img[::-1]))
-
-img = render_object("phong", focal, eye, lookat, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, mat, lights, Ia, "specular")
-plt.imsave('6.jpg', np.array(img[::-1]))
-
-img = render_object("phong", focal, eye, lookat, up, bg_color, M, N, H, W,
-                    verts, vert_colors, faces, mat, lights, Ia, "full")
-plt.imsave('7.jpg', np.array(img[::-1]))
+images = render_object("phong", focal, eye, lookat, up, bg_color, M, N, H, W,
+                       verts, vert_colors, faces, mat, lights, Ia, outputs, engine="halfspace")
+for i, lighting in enumerate(outputs):
+    write_image('%d.png' % (i + 4), images[lighting], flip=True)
 
 print("Objects rendered in", time.time() - start_time, "sec")
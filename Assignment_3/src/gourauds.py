@@ -2,7 +2,8 @@ from helpers import *
 from lighting import *
 
 
-def shade_gouraud(verts_p, verts_n, verts_c, bcoords, cam_pos, mat, lights, light_amb, X, lighting):
+def shade_gouraud(verts_p, verts_n, verts_c, bcoords, cam_pos, mat, lights, light_amb, X, lighting,
+                  vdepth=None, zbuffer=None, setup=None, lit_colors=None):
     # triangle filling function where the inner points of the triangle get the
     # RGB values that result from the linear interpolation of the RGB values of
     # its vertices (first vertically and then horizontally)
@@ -11,95 +12,108 @@ def shade_gouraud(verts_p, verts_n, verts_c, bcoords, cam_pos, mat, lights, ligh
     # triangle's vertices
     # - vcolors: 3x3 matrix containing in each row the color of one of the vertices in
     # RGB form and with values in the spectrum [0, 1]
+    # - setup: the record of the triangle from triangle_setup, when it was prepared along with other triangles
+    # - lit_colors: 3x3 matrix containing in each row the already lit color of one of the vertices (e.g. from
+    # light_vertices); if given, the vertices are not lit again
     # - updatedcanvas: MxNx3 matrix containing for each point of the triangle (vertices
     # and inner points) the calculated RGB values as well as the pre-existing triangles
     # of the input canvas covering possible common colored points with the pre-existing
     # triangles
 
-    for i in range(verts_c.shape[0]):
-        verts_c[:, i] = light(bcoords, verts_n[:, i].T, verts_c[:, i].T, cam_pos, mat, lights, light_amb, lighting).T[0]
+    # light the three vertices at once (without changing verts_c); the lit colors keep the type of verts_c
+    if lit_colors is None:
+        lit_colors = light_batch(bcoords, verts_n.T, verts_c.T, cam_pos, mat, lights, light_amb, lighting)
+        lit_colors = lit_colors.astype(verts_c.dtype)
 
     vertices = verts_p.T
-    vcolors = verts_c.T
+    vcolors = lit_colors
 
     # initialize updatedcanvas as canvas
     updatedcanvas = X
 
+    if setup is None:
+        setup = triangle_setup(vertices[np.newaxis])[0]
+
     # check if there are fewer than 3 distinct vertices and a triangle cannot be formed
-    if len(np.unique(vertices, axis=0)) < 3:
+    if setup["distinct"] < 3:
+        return updatedcanvas
+
+    # plane interpolating the depth of the vertices
+    plane = depth_plane(vertices, vdepth) if zbuffer is not None else None
+
+    # check if all the vertices are on the same row and there are not enough active edges
+    if not setup["fill"]:
         return updatedcanvas
 
-    # define the minimum and the maximum y of the triangle
-    y_max = vertices[:, 1].max()
-    y_min = vertices[:, 1].min()
+    # the spans are scissored to the canvas; the rows below it are only scanned to advance the edges
+    M, N = canvas_size(X)
+    if setup["y_max"] < 0:
+        return updatedcanvas
+
+    # filling algorith (first scan every row and then fill the visible pixels of its span at once); the colors of
+    # the two edges of every row are interpolated at once
+    ys, xs, edges = scan_edges(setup, min(setup["y_max"], M - 1))
+    edge_colors = edge_values(vertices, vcolors, edges, ys)
+
+    for y, (x1, x2), (colorA, colorB) in zip(ys.tolist(), xs, edge_colors):
+        if y < 0:
+            continue
 
-    # initialize edge objects
-    edgeAB = Edge(np.array([vertices[0, :], vertices[1, :]]), np.array([vcolors[0, :], vcolors[1, :]]), None,
-                  slope(vertices[0, :], vertices[1, :]), False)
-    edgeBC = Edge(np.array([vertices[1, :], vertices[2, :]]), np.array([vcolors[1, :], vcolors[2, :]]), None,
-                  slope(vertices[1, :], vertices[2, :]), False)
-    edgeCA = Edge(np.array([vertices[2, :], vertices[0, :]]), np.array([vcolors[2, :], vcolors[0, :]]), None,
-                  slope(vertices[2, :], vertices[0, :]), False)
+        span = np.arange(max(int(min(x1, x2)), 0), min(int(max(x1, x2)), N - 1) + 1)
+        span = depth_test_span(zbuffer, plane, span, y)
+        color = np.clip(interpolate_span(x1, x2, colorA, colorB, span), 0, 1)
+        updatedcanvas[y, span] = canvas_color(color, updatedcanvas)
 
-    # initialize parameters that will be used for the scanning
-    active_edges = []
-    edges = [edgeAB, edgeBC, edgeCA]
-    horizontal_line = False
+    return updatedcanvas
 
-    # find the active edges list of the scanning line y == y_min
-    for i in range(len(edges)):
 
-        if y_min == edges[i].y_min:
+def shade_gouraud_halfspace(verts_p, verts_n, verts_c, bcoords, cam_pos, mat, lights, light_amb, X, lighting,
+                            vdepth=None, zbuffer=None, lit_colors=None):
+    # same as shade_gouraud, but the inner points of the triangle are found by evaluating its edge functions over its
+    # bounding box as arrays and get the lit colors of the vertices weighted by their barycentric coordinates, which
+    # is the same linear interpolation as the vertical and then horizontal one of the scanline
+    # - verts_p: 2x3 matrix containing in each column the 2D coordinates of one of the triangle's vertices
+    # - verts_n: 3x3 matrix containing in each column the normal vector of one of the triangle's vertices
+    # - verts_c: 3x3 matrix containing in each column the color of one of the triangle's vertices
+    # - bcoords: 3x1 vector with the point of the surface used for the lighting of the triangle
+    # - lighting: string {"ambient", "diffusion", "specular", "full"}, or a list of them to fill the canvas of each
+    # output from a single coverage of the triangle
+    # - X: MxNx3 image (perhaps) with pre-existing triangles, or a dictionary of such images, one per lighting output
+    # - vdepth: 3x1 vector with the depth of each vertex, only used along with zbuffer
+    # - zbuffer: MxN matrix with the depth of the nearest point drawn on each pixel; if given, points that are not
+    # nearer than it are not drawn (nor lit) and it is updated with the depth of the drawn ones
+    # - lit_colors: 3x3 matrix with the already lit color of each vertex (one per row), or a dictionary of such
+    # matrices, one per lighting output; if given, the vertices are not lit again
+    # - updatedcanvas: MxNx3 matrix with the filled triangle on top of the input canvas
 
-            if edges[i].edge_slope != 0:
-                active_edges.append(i)
-                edges[i].is_active = True
-            else:
-                horizontal_line = True
+    vertices = verts_p.T
 
-    # check if there are not enough active edges
-    if len(active_edges) < 2:
+    # initialize updatedcanvas as canvas
+    updatedcanvas = X
+
+    # check if there are fewer than 3 distinct vertices and a triangle cannot be formed
+    if distinct_vertices(vertices) < 3:
         return updatedcanvas
 
-    # check the condition where y = y_min and do the appropriate filling
-    if not horizontal_line:
-        x1 = x2 = 0
+    ys, xs, weights = edge_coverage(vertices, *canvas_size(X))
+    ys, xs, weights = depth_filter(zbuffer, ys, xs, weights, vdepth)
 
-        for i in range(len(vertices)):
-            if vertices[i, 1] == y_min:
-                x1 = vertices[i, 0]
-                x2 = x1
+    # there is nothing to light if the triangle is entirely hidden
+    if len(ys) == 0:
+        return updatedcanvas
 
+    if isinstance(lighting, str):
+        # light the three vertices at once
+        vcolors = lit_colors
+        if vcolors is None:
+            vcolors = light_batch(bcoords, verts_n.T, verts_c.T, cam_pos, mat, lights, light_amb, lighting)
+        updatedcanvas[ys, xs] = canvas_color(np.clip(weights @ vcolors, 0, 1), updatedcanvas)
     else:
-        x1, y1, x2, y2, color1, color2 = initialize_variables(edges, active_edges)
-
-    # filling algorith (first scan every row and then scan every column)
-    for y in range(y_min + 1, y_max + 1):
-
-        if edges[active_edges[0]].edge_slope != float('inf'):
-            x1 = x1 + 1 / edges[active_edges[0]].edge_slope
-
-        if edges[active_edges[1]].edge_slope != float('inf'):
-            x2 = x2 + 1 / edges[active_edges[1]].edge_slope
-
-        colorA = interpolate_vectors(edges[active_edges[0]].vertices[0],
-                                     edges[active_edges[0]].vertices[1],
-                                     edges[active_edges[0]].vcolors[0, :],
-                                     edges[active_edges[0]].vcolors[1, :],
-                                     y, 2)
-        colorB = interpolate_vectors(edges[active_edges[1]].vertices[0],
-                                     edges[active_edges[1]].vertices[1],
-                                     edges[active_edges[1]].vcolors[0, :],
-                                     edges[active_edges[1]].vcolors[1, :],
-                                     y, 2)
-
-        for x in range(int(min(x1, x2)), int(max(x1, x2)) + 1):
-            updatedcanvas[y, int(round(x))] = np.clip(interpolate_vectors([x1, y], [x2, y],
-                                                                          colorA, colorB,
-                                                                          x, 1), 0, 1)
-        if y == y_max:
-            break
-
-        active_edges = update_active_edges(edges, active_edges, y)
+        # light the three vertices once for all the outputs and interpolate each of them
+        outputs = lit_colors
+        if outputs is None:
+            outputs = light_components(bcoords, verts_n.T, verts_c.T, cam_pos, mat, lights, light_amb, lighting)
+        for output, vcolors in outputs.items():
+            updatedcanvas[output][ys, xs] = canvas_color(np.clip(weights @ vcolors, 0, 1), updatedcanvas[output])
 
     return updatedcanvas
@@ -0,0 +1,388 @@
+import os
+import warnings
+from helpers import *
+
+# Importers of Wavefront OBJ and binary PLY meshes. The files are read in chunks that are parsed with whole array
+# operations into growable numpy buffers, so memory stays bounded by the size of the mesh (plus one chunk) and there
+# are no per-line python objects. They return the arrays that render_object expects:
+# - verts: 3 × N_v matrix with the coordinates of the vertices
+# - vert_colors: N_v × 3 matrix with the color of each vertex in [0, 1] (white when the file has no colors)
+# - faces: N_t × 3 matrix with the (0-based) indices of the vertices of each triangle; polygons are split into fans
+
+SPACE, TAB, LF, CR = ord(" "), ord("\t"), ord("\n"), ord("\r")
+
+# numpy types of the PLY property types
+PLY_TYPES = {"char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1", "short": "i2", "int16": "i2",
+             "ushort": "u2", "uint16": "u2", "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+             "float": "f4", "float32": "f4", "double": "f8", "float64": "f8"}
+
+
+class GrowableArray:
+    # array of rows that doubles its capacity when it is full, so appending blocks of rows costs amortized constant
+    # time per row; it holds at most twice the rows that were appended
+    # width: number of columns
+    # dtype: type of the elements
+    # size: number of rows appended
+
+    def __init__(self, width, dtype, capacity=4096):
+        self.data = np.empty((max(capacity, 1), width), dtype=dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def extend(self, rows):
+        needed = self.size + len(rows)
+        if needed > len(self.data):
+            data = np.empty((max(needed, 2 * len(self.data)), self.data.shape[1]), dtype=self.data.dtype)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+
+        self.data[self.size:needed] = rows
+        self.size = needed
+
+    def array(self):
+        return self.data[:self.size]
+
+
+def inside_marks(marker, reset):
+    # finds the bytes from a marker byte up to (not including) the next reset byte, e.g. comments up to the end of
+    # their line
+    # - marker, reset: boolean vectors over the bytes
+    # - inside: boolean vector, True from each marker up to the next reset
+
+    index = np.arange(len(marker))
+    last_marker = np.maximum.accumulate(np.where(marker, index, -1))
+    last_reset = np.maximum.accumulate(np.where(reset, index, -1))
+
+    return last_marker > last_reset
+
+
+def parse_numbers(data):
+    # parses whitespace separated numbers
+    # - data: bytes
+    # - values: vector with the numbers read up to the first token that is not a number; None if that raised an error
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        try:
+            return np.fromstring(data, sep=" ")
+        except ValueError:
+            return None
+
+
+def parse_lines(text):
+    # parses the numbers of lines of text whose keyword has been blanked out
+    # - text: uint8 vector with the bytes of whole lines (each one ends with a newline)
+    # - values: vector with all the numbers, in order
+    # - counts: vector with the number of numbers on each line
+
+    whitespace = (text == SPACE) | (text == TAB) | (text == LF) | (text == CR)
+    token_start = ~whitespace & np.r_[True, whitespace[:-1]]
+    line = np.cumsum(np.r_[0, text[:-1] == LF])
+    counts = np.bincount(line[token_start], minlength=np.count_nonzero(text == LF))
+
+    # a token that is not a number stops fromstring (with an error or, in older numpy versions, a warning and the
+    # values read so far), so the malformed line is then found by parsing the lines one by one
+    values = parse_numbers(text.tobytes())
+    if values is None or len(values) != counts.sum():
+        for words in text.tobytes().split(b"\n"):
+            numbers = parse_numbers(words)
+            if numbers is None or len(numbers) != len(words.split()):
+                raise ValueError("malformed line: %r" % words.strip().decode("ascii", "replace"))
+
+    return values, counts
+
+
+def fan_triangles(indices, counts):
+    # splits polygons into fans of triangles around their first vertex
+    # - indices: vector with the vertex indices of all the polygons, one after the other
+    # - counts: vector with the number of vertices of each polygon (at least 3)
+    # - faces: N_t × 3 matrix with the vertex indices of the triangles
+
+    if np.all(counts == 3):
+        return indices.reshape(-1, 3)
+
+    starts = np.cumsum(counts) - counts
+    fans = counts - 2
+    first = np.repeat(starts, fans)
+    k = np.arange(fans.sum()) - np.repeat(np.cumsum(fans) - fans, fans) + 1
+
+    return np.column_stack((indices[first], indices[first + k], indices[first + k + 1]))
+
+
+def parse_obj_chunk(chunk, num_verts, verts, colors, faces):
+    # parses the vertex and face lines of a chunk of an OBJ file into the buffers
+    # - chunk: bytes of whole lines
+    # - num_verts: number of vertices of the previous chunks (for the negative, relative indices)
+    # - verts, colors, faces: the GrowableArray buffers
+
+    buf = np.frombuffer(chunk, dtype=np.uint8).copy()
+
+    # comments and the texture/normal references of the face vertices ("1/2/3") are blanked out
+    buf[inside_marks(buf == ord("#"), buf == LF)] = SPACE
+
+    # the keyword of every line is its first byte after the leading whitespace (the newline, for a blank line)
+    ends = np.flatnonzero(buf == LF)
+    starts = np.r_[0, ends[:-1] + 1]
+    nonblank = np.flatnonzero((buf != SPACE) & (buf != TAB))
+    keywords = nonblank[np.searchsorted(nonblank, starts)]
+    padded = np.r_[buf, SPACE, SPACE]
+    separated = (padded[keywords + 1] == SPACE) | (padded[keywords + 1] == TAB)
+    is_vertex = (buf[keywords] == ord("v")) & separated
+    is_face = (buf[keywords] == ord("f")) & separated
+
+    # the keywords are blanked out, so that only the numbers of the lines are parsed
+    buf[keywords[is_vertex | is_face]] = SPACE
+    line = np.cumsum(np.r_[0, buf[:-1] == LF])
+
+    if is_vertex.any():
+        text = buf[is_vertex[line]]
+        values, counts = parse_lines(text)
+        assert np.all(counts >= 3), "vertex with fewer than 3 coordinates"
+
+        first = np.cumsum(counts) - counts
+        verts.extend(values[first[:, np.newaxis] + np.arange(3)])
+
+        # optional colors after the coordinates ("v x y z r g b")
+        rgb = np.ones((len(counts), 3))
+        has_color = counts >= 6
+        rgb[has_color] = values[first[has_color, np.newaxis] + np.arange(3, 6)]
+        colors.extend(rgb)
+
+    if is_face.any():
+        face_text = buf.copy()
+        face_text[inside_marks(face_text == ord("/"), (face_text == SPACE) | (face_text == TAB) |
+                               (face_text == LF) | (face_text == CR))] = SPACE
+        text = face_text[is_face[line]]
+        values, counts = parse_lines(text)
+        assert np.all(counts >= 3), "face with fewer than 3 vertices"
+        indices = values.astype(np.int64)
+
+        # OBJ indices start at 1; negative ones count back from the last vertex defined before the face
+        defined = num_verts + np.cumsum(is_vertex) - is_vertex
+        before = np.repeat(defined[is_face], counts)
+        indices = np.where(indices < 0, before + indices, indices - 1)
+
+        faces.extend(fan_triangles(indices, counts))
+
+
+def read_obj(path, chunk_size=1 << 24, precision=None):
+    # reads the vertices (with their optional colors) and the faces of a Wavefront OBJ file
+    # - path: the name of the file
+    # - chunk_size: number of bytes read and parsed at a time
+    # - precision: string {"double", "single", "half", "compact"} deciding the types of the arrays (see PRECISIONS);
+    # None for float64 and int64
+    # - verts, vert_colors, faces: see the top of the module
+
+    float_type, index_type = (np.float64, np.int64) if precision is None else PRECISIONS[precision][:2]
+    verts = GrowableArray(3, float_type)
+    colors = GrowableArray(3, float_type)
+    faces = GrowableArray(3, index_type)
+
+    with open(path, "rb") as f:
+        rest = b""
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                if rest.strip():
+                    parse_obj_chunk(rest + b"\n", len(verts), verts, colors, faces)
+                break
+
+            # parse the whole lines and keep the last, partial one for the next chunk
+            data = rest + data
+            cut = data.rfind(b"\n") + 1
+            rest = data[cut:]
+            if cut:
+                parse_obj_chunk(data[:cut], len(verts), verts, colors, faces)
+
+    faces = faces.array()
+    assert np.all((faces >= 0) & (faces < len(verts))), "face with a vertex index out of range"
+
+    return verts.array().T, colors.array(), faces
+
+
+def read_ply_header(f):
+    # reads the header of a PLY file
+    # - f: the file, opened in binary mode; it is left at the start of the data
+    # - byte_order: "<" or ">"
+    # - elements: list of (name, count, properties); every property is (name, type) or (name, count type, item type)
+    # for lists
+
+    assert f.readline().strip() == b"ply", "not a PLY file"
+    byte_order, elements = None, []
+
+    while True:
+        words = f.readline().decode("ascii").split()
+        if not words or words[0] in ["comment", "obj_info"]:
+            continue
+        if words[0] == "end_header":
+            break
+
+        if words[0] == "format":
+            assert words[1] != "ascii", "only binary PLY files are supported"
+            byte_order = "<" if words[1] == "binary_little_endian" else ">"
+        elif words[0] == "element":
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == "property":
+            if words[1] == "list":
+                elements[-1][2].append((words[4], PLY_TYPES[words[2]], PLY_TYPES[words[3]]))
+            else:
+                elements[-1][2].append((words[2], PLY_TYPES[words[1]]))
+
+    return byte_order, elements
+
+
+def ply_records(data, count_type, index_size):
+    # finds the face records (a count n followed by n indices) at the start of a buffer by following the counts from
+    # its first byte; the chain of records is walked with pointer jumping (every byte points to the end of the record
+    # that would start there and the pointers are squared until the chain is complete), so the walk takes O(log n)
+    # whole array operations however the polygon sizes are mixed
+    # - data: uint8 vector
+    # - count_type: numpy type (with byte order) of the counts
+    # - index_size: number of bytes of an index
+    # - starts: vector with the offset of each whole record, in order
+    # - end: the offset after the last whole record, where a partial record (if any) starts
+
+    size, count_size = len(data), np.dtype(count_type).itemsize
+    partial, bad = size + 1, size + 2
+
+    # a chain of records with the same number of vertices as the first one (the usual case) is checked directly
+    if size >= count_size:
+        n = int(np.frombuffer(data[:count_size].tobytes(), dtype=count_type)[0])
+        starts = np.arange(0, size - count_size + 1, count_size + n * index_size)
+        if n >= 3 and np.all(data[starts[:, np.newaxis] + np.arange(count_size)].view(count_type) == n):
+            return (starts[:-1], starts[-1]) if starts[-1] + count_size + n * index_size > size else (starts, size)
+
+    # the end of the record starting at each byte; the ends past the buffer become the partial sentinel and the
+    # counts of fewer than 3 vertices the bad one, while the sentinels point to themselves
+    jump = np.arange(size + 3)
+    jump[:size] = partial
+    if size >= count_size:
+        offsets = np.arange(size - count_size + 1)
+        counts = np.ndarray(len(offsets), dtype=count_type, buffer=data, strides=(1,)).astype(np.int64)
+        ends = offsets + count_size + counts * index_size
+        jump[offsets] = np.where(counts < 3, bad, np.where(ends <= size, ends, partial))
+
+    # after k squarings the chain holds its first 2^k records
+    chain = np.array([0])
+    while True:
+        longer = np.union1d(chain, jump[chain])
+        if len(longer) == len(chain):
+            break
+        chain, jump = longer, jump[jump]
+
+    assert chain[-1] != bad, "face with fewer than 3 vertices"
+    starts = chain[chain < size]
+    if chain[-1] == partial:
+        return starts[:-1], starts[-1]
+
+    return starts, size
+
+
+def read_ply_faces(f, count, count_type, index_type, chunk_rows, faces):
+    # reads the vertex index lists of the faces of a binary PLY file into a buffer; every byte is read once, in chunks
+    # whose records are found by ply_records, and the partial record at the end of a chunk is carried to the next one
+    # - f: the file, at the start of the faces; it is left at their end
+    # - count: number of faces
+    # - count_type, index_type: numpy types (with byte order) of the list length and of the indices
+    # - chunk_rows: maximum number of faces read at a time
+    # - faces: the GrowableArray buffer
+
+    count_size, index_size = np.dtype(count_type).itemsize, np.dtype(index_type).itemsize
+    triangle_size = count_size + 3 * index_size
+    rest = np.zeros(0, dtype=np.uint8)
+    read = 0
+
+    while read < count:
+        # the remaining faces take at least a triangle each, so the chunk never goes past them; it is also long
+        # enough to complete the partial record, and at most 4 MiB, as the walk holds a few integers per byte
+        length = min(chunk_rows, count - read, max((1 << 22) // triangle_size, 1)) * triangle_size - len(rest)
+        if len(rest) >= count_size:
+            n = int(np.frombuffer(rest[:count_size].tobytes(), dtype=count_type)[0])
+            length = max(length, count_size + n * index_size - len(rest))
+        data = np.frombuffer(f.read(max(length, count_size - len(rest))), dtype=np.uint8)
+        assert len(data), "the file ends before its last face"
+        data = np.concatenate((rest, data))
+
+        starts, end = ply_records(data, count_type, index_size)
+        rest = data[end:]
+
+        # the indices of all the records, in order: the n indices after each count
+        counts = data[starts[:, np.newaxis] + np.arange(count_size)].view(count_type).ravel().astype(np.int64)
+        first = np.repeat(starts + count_size, counts)
+        positions = first + index_size * (np.arange(len(first)) - np.repeat(np.cumsum(counts) - counts, counts))
+        indices = data[positions[:, np.newaxis] + np.arange(index_size)].view(index_type).ravel()
+
+        faces.extend(fan_triangles(indices.astype(np.int64), counts))
+        read += len(starts)
+
+
+def read_ply(path, chunk_rows=1 << 20, precision=None):
+    # reads the vertices (with their optional colors) and the faces of a binary PLY file
+    # - path: the name of the file
+    # - chunk_rows: number of vertices or faces read and converted at a time
+    # - precision: as in read_obj
+    # - verts, vert_colors, faces: see the top of the module
+
+    float_type, index_type = (np.float64, np.int64) if precision is None else PRECISIONS[precision][:2]
+
+    with open(path, "rb") as f:
+        byte_order, elements = read_ply_header(f)
+        verts = colors = faces = None
+
+        for name, count, properties in elements:
+            if name == "vertex":
+                record = np.dtype([(p[0], byte_order + p[1]) for p in properties])
+                names = record.names
+                color_names = [c for c in [("red", "green", "blue"), ("diffuse_red", "diffuse_green", "diffuse_blue"),
+                                           ("r", "g", "b")] if set(c) <= set(names)]
+
+                verts = GrowableArray(3, float_type, count)
+                colors = GrowableArray(3, float_type, count)
+                for start in range(0, count, chunk_rows):
+                    rows = min(chunk_rows, count - start)
+                    block = np.frombuffer(f.read(rows * record.itemsize), dtype=record)
+                    verts.extend(np.column_stack([block[c] for c in ("x", "y", "z")]))
+
+                    if color_names:
+                        rgb = np.column_stack([block[c] for c in color_names[0]]).astype(float_type)
+                        if block.dtype[color_names[0][0]].kind in "ui":
+                            rgb /= np.iinfo(block.dtype[color_names[0][0]]).max
+                        colors.extend(rgb)
+                    else:
+                        colors.extend(np.ones((rows, 3)))
+
+            elif name == "face":
+                assert len(properties) == 1 and len(properties[0]) == 3, "faces must have a single list of indices"
+                faces = GrowableArray(3, index_type, count)
+                read_ply_faces(f, count, byte_order + properties[0][1], byte_order + properties[0][2], chunk_rows,
+                               faces)
+
+            elif all(len(p) == 2 for p in properties):
+                # skip the elements that are not needed (their records have a fixed size)
+                f.seek(count * np.dtype([(p[0], p[1]) for p in properties]).itemsize, os.SEEK_CUR)
+            else:
+                break
+
+    assert verts is not None and faces is not None, "the file has no vertices or faces"
+
+    faces = faces.array()
+    assert np.all((faces >= 0) & (faces < len(verts))), "face with a vertex index out of range"
+
+    return verts.array().T, colors.array(), faces
+
+
+def read_mesh(path, precision=None):
+    # reads a mesh file, chosen by its extension: ".obj" or ".ply"
+    # - path: the name of the file
+    # - precision: as in read_obj
+    # - verts, vert_colors, faces: see the top of the module
+
+    extension = path.rsplit(".", 1)[-1].lower()
+    assert extension in ["obj", "ply"]
+
+    if extension == "obj":
+        return read_obj(path, precision=precision)
+
+    return read_ply(path, precision=precision)
@@ -82,3 +82,108 @@ def light(point, normal, vcolor, cam_pos, mat, lights, light_amb, lighting):
             specular(point, normal, vcolor, cam_pos, mat, lights)
 
     return I
+
+
+def pack_lights(lights):
+    # packs the positions and the intensities of a list of PointLight objects into arrays
+    # - lights: list of objects of type PointLight
+    # - positions: L × 3 matrix with the position of each light source
+    # - intensities: L × 3 matrix with the intensity of each light source for each color (rgb)
+
+    positions = np.array([np.ravel(l.pos) for l in lights], dtype=float).reshape(-1, 3)
+    intensities = np.array([np.ravel(l.intensity) for l in lights], dtype=float).reshape(-1, 3)
+
+    return positions, intensities
+
+
+def light_batch(points, normals, vcolors, cam_pos, mat, lights, light_amb, lighting):
+    # calculates the lighting of P points of a PhongMaterial surface at once, with the same model as light
+    # - points: P × 3 matrix with the 3D coordinates of the points (or a single 3D point shared by all of them)
+    # - normals: P × 3 matrix with the normal vector of the surface at each point
+    # - vcolors: P × 3 matrix with the color (rgb) of each point as floats in [0, 1]
+    # - cam_pos: 3 × 1 vector with the 3D coordinates of the camera (observer)
+    # - mat: object of type PhongMaterial
+    # - lights: the (positions, intensities) arrays of pack_lights, or a list of objects of type PointLight
+    # - light_amb: the ambient radiation intensity, a float or a 3 × 1 vector with one component per color
+    # - lighting: string {"ambient", "diffusion", "specular", "full"}
+    # - I: return value; P × 3 matrix of the intensity for each color (rgb) that reflects from each point
+
+    return light_components(points, normals, vcolors, cam_pos, mat, lights, light_amb, [lighting])[lighting]
+
+
+def light_components(points, normals, vcolors, cam_pos, mat, lights, light_amb, outputs):
+    # same as light_batch, but calculates several lighting outputs of the same points at once; the light directions
+    # are shared by the diffuse and the specular reflection and "full" is the sum of the other three
+    # - points ... light_amb: as in light_batch
+    # - outputs: list of strings from {"ambient", "diffusion", "specular", "full"}
+    # - I: return value; dictionary that maps each output to its P × 3 matrix of intensities
+
+    for lighting in outputs:
+        assert lighting in ["ambient", "diffusion", "specular", "full"]
+
+    if not isinstance(lights, tuple):
+        lights = pack_lights(lights)
+    positions, intensities = lights
+
+    normals = np.asarray(normals, dtype=float).reshape(-1, 3)
+    vcolors = np.asarray(vcolors, dtype=float).reshape(-1, 3)
+    points = np.broadcast_to(np.asarray(points, dtype=float).reshape(-1, 3), normals.shape)
+
+    needed = set(outputs)
+    if "full" in needed:
+        needed |= {"ambient", "diffusion", "specular"}
+
+    I = {}
+
+    if "ambient" in needed:
+        I["ambient"] = np.zeros(normals.shape) + mat.k_a * np.ravel(light_amb)
+
+    if "diffusion" in needed or "specular" in needed:
+        # P × L × 3 normalized directions from every point to every light source
+        L_d = positions[np.newaxis, :, :] - points[:, np.newaxis, :]
+        L_d /= np.linalg.norm(L_d, axis=2, keepdims=True)
+        L_dot_n = np.einsum('plk,pk->pl', L_d, normals)
+
+    if "diffusion" in needed:
+        I_d = mat.k_d * np.maximum(L_dot_n, 0)
+        I["diffusion"] = (I_d @ intensities) * vcolors
+
+    if "specular" in needed:
+        V_s = np.ravel(cam_pos).astype(float) - points
+        V_s /= np.linalg.norm(V_s, axis=1, keepdims=True)
+
+        R = 2 * L_dot_n[:, :, np.newaxis] * normals[:, np.newaxis, :] - L_d
+        R /= np.linalg.norm(R, axis=2, keepdims=True)
+
+        I_s = mat.k_s * np.einsum('pk,plk->pl', V_s, R) ** mat.n_phong
+        I["specular"] = (I_s @ intensities) * vcolors
+
+    if "full" in needed:
+        I["full"] = I["ambient"] + I["diffusion"] + I["specular"]
+
+    return {lighting: I[lighting] for lighting in outputs}
+
+
+def light_vertices(verts, normals, vert_colors, vertices, cam_pos, mat, lights, light_amb, lighting):
+    # lights vertices of a mesh once, each at its own position, so that the triangles that share them only interpolate
+    # their lit colors (instead of lighting their three vertices each)
+    # - verts: 3 × N_v matrix with the coordinates of the vertices of the mesh
+    # - normals: 3 × N_v matrix with the normal vector of each vertex
+    # - vert_colors: N_v × 3 matrix with the color (rgb) of each vertex
+    # - vertices: vector with the indices of the vertices to light
+    # - cam_pos ... light_amb: as in light_batch
+    # - lighting: string {"ambient", "diffusion", "specular", "full"}, or a list of them
+    # - I: return value; N_v × 3 matrix with the lit color of each vertex (zero for the vertices that are not lit), or
+    # a dictionary that maps each output of a list of lighting to such a matrix; the colors keep the type of
+    # vert_colors
+
+    outputs = [lighting] if isinstance(lighting, str) else lighting
+    lit = light_components(verts[:, vertices].T, normals[:, vertices].T, vert_colors[vertices], cam_pos, mat, lights,
+                           light_amb, outputs)
+
+    I = {}
+    for output in outputs:
+        I[output] = np.zeros((len(vert_colors), 3), dtype=vert_colors.dtype)
+        I[output][vertices] = lit[output]
+
+    return I[lighting] if isinstance(lighting, str) else I
@@ -2,7 +2,10 @@ from helpers import *
 from lighting import *
 
 
-def shade_phong(verts_p, verts_n, verts_c, bcoords, cam_pos, mat, lights, light_amb, X, lighting):
+def shade_phong(verts_p, verts_n, verts_c, bcoords, cam_pos, mat, lights, light_amb, X, lighting,
+                vdepth=None, zbuffer=None, setup=None):
+    # triangle filling function where the colors and the normal vectors of the vertices are interpolated to every
+    # inner point of the triangle, which is then lit; the arguments are those of shade_gouraud
     vertices = verts_p.T
     vcolors = verts_c.T
     normals = verts_n.T
@@ -10,94 +13,85 @@ def shade_phong(verts_p, verts_n, verts_c, bcoords, cam_pos, mat, lights, light_
     # initialize updatedcanvas as canvas
     updatedcanvas = X
 
+    if setup is None:
+        setup = triangle_setup(vertices[np.newaxis])[0]
+
     # check if there are fewer than 3 distinct vertices and a triangle cannot be formed
-    if len(np.unique(vertices, axis=0)) < 3:
+    if setup["distinct"] < 3:
         return updatedcanvas
 
-    # define the minimum and the maximum y of the triangle
-    y_max = vertices[:, 1].max()
-    y_min = vertices[:, 1].min()
+    # plane interpolating the depth of the vertices
+    plane = depth_plane(vertices, vdepth) if zbuffer is not None else None
 
-    # initialize edge objects
-    edgeAB = Edge(np.array([vertices[0, :], vertices[1, :]]), np.array([vcolors[0, :], vcolors[1, :]]),
-                  np.array([normals[0, :], normals[1, :]]), slope(vertices[0, :], vertices[1, :]), False)
-    edgeBC = Edge(np.array([vertices[1, :], vertices[2, :]]), np.array([vcolors[1, :], vcolors[2, :]]),
-                  np.array([normals[1, :], normals[2, :]]), slope(vertices[1, :], vertices[2, :]), False)
-    edgeCA = Edge(np.array([vertices[2, :], vertices[0, :]]), np.array([vcolors[2, :], vcolors[0, :]]),
-                  np.array([normals[2, :], normals[0, :]]), slope(vertices[2, :], vertices[0, :]), False)
+    # check if all the vertices are on the same row and there are not enough active edges
+    if not setup["fill"]:
+        return updatedcanvas
 
-    # initialize parameters that will be used for the scanning
-    active_edges = []
-    edges = [edgeAB, edgeBC, edgeCA]
-    horizontal_line = False
+    # the spans are scissored to the canvas; the rows below it are only scanned to advance the edges
+    M, N = canvas_size(X)
+    if setup["y_max"] < 0:
+        return updatedcanvas
 
-    # find the active edges list of the scanning line y == y_min
-    for i in range(len(edges)):
+    # filling algorith (first scan every row and then light and fill the visible pixels of its span at once); the
+    # colors and the normals of the two edges of every row are interpolated at once
+    ys, xs, edges = scan_edges(setup, min(setup["y_max"], M - 1))
+    edge_colors = edge_values(vertices, vcolors, edges, ys)
+    edge_normals = edge_values(vertices, normals, edges, ys)
 
-        if y_min == edges[i].y_min:
+    for y, (x1, x2), (colorA, colorB), (normalA, normalB) in zip(ys.tolist(), xs, edge_colors, edge_normals):
+        if y < 0:
+            continue
 
-            if edges[i].edge_slope != 0:
-                active_edges.append(i)
-                edges[i].is_active = True
-            else:
-                horizontal_line = True
+        # interpolate the colors and the normals of the visible points of the span and light them all at once
+        span = np.arange(max(int(min(x1, x2)), 0), min(int(max(x1, x2)), N - 1) + 1)
+        span = depth_test_span(zbuffer, plane, span, y)
 
-    # check if there are not enough active edges
-    if len(active_edges) < 2:
-        return updatedcanvas
+        if len(span):
+            span_colors = interpolate_span(x1, x2, colorA, colorB, span)
+            span_normals = interpolate_span(x1, x2, normalA, normalB, span)
+            I = light_batch(bcoords, span_normals, span_colors, cam_pos, mat, lights, light_amb, lighting)
+            updatedcanvas[y, span] = canvas_color(np.clip(I, 0, 1), updatedcanvas)
+
+    return updatedcanvas
+
+
+def shade_phong_halfspace(verts_p, verts_n, verts_c, bcoords, cam_pos, mat, lights, light_amb, X, lighting,
+                          vdepth=None, zbuffer=None):
+    # same as shade_phong, but the inner points of the triangle are found by evaluating its edge functions over its
+    # bounding box as arrays; the colors and normals of the vertices are weighted by the barycentric coordinates of
+    # every point, which is then lit, and all the points are written with a single masked assignment
+    # - verts_p: 2x3 matrix containing in each column the 2D coordinates of one of the triangle's vertices
+    # - verts_n: 3x3 matrix containing in each column the normal vector of one of the triangle's vertices
+    # - verts_c: 3x3 matrix containing in each column the color of one of the triangle's vertices
+    # - bcoords: 3x1 vector with the point of the surface used for the lighting of the triangle
+    # - lighting: string {"ambient", "diffusion", "specular", "full"}, or a list of them to fill the canvas of each
+    # output from a single coverage of the triangle
+    # - X: MxNx3 image (perhaps) with pre-existing triangles, or a dictionary of such images, one per lighting output
+    # - vdepth: 3x1 vector with the depth of each vertex, only used along with zbuffer
+    # - zbuffer: MxN matrix with the depth of the nearest point drawn on each pixel; if given, points that are not
+    # nearer than it are not drawn (nor lit) and it is updated with the depth of the drawn ones
+    # - updatedcanvas: MxNx3 matrix with the filled triangle on top of the input canvas
 
-    # check the condition where y = y_min and do the appropriate filling
-    if not horizontal_line:
-        x1 = x2 = 0
+    vertices = verts_p.T
+
+    # initialize updatedcanvas as canvas
+    updatedcanvas = X
+
+    # check if there are fewer than 3 distinct vertices and a triangle cannot be formed
+    if distinct_vertices(vertices) < 3:
+        return updatedcanvas
 
-        for i in range(len(vertices)):
-            if vertices[i, 1] == y_min:
-                x1 = vertices[i, 0]
-                x2 = x1
+    ys, xs, weights = edge_coverage(vertices, *canvas_size(X))
+    ys, xs, weights = depth_filter(zbuffer, ys, xs, weights, vdepth)
+    colors = weights @ verts_c.T
+    normals = weights @ verts_n.T
 
+    if isinstance(lighting, str):
+        I = light_batch(bcoords, normals, colors, cam_pos, mat, lights, light_amb, lighting)
+        updatedcanvas[ys, xs] = canvas_color(np.clip(I, 0, 1), updatedcanvas)
     else:
-        x1, y1, x2, y2, color1, color2 = initialize_variables(edges, active_edges)
-
-    # filling algorith (first scan every row and then scan every column)
-    for y in range(y_min + 1, y_max + 1):
-
-        if edges[active_edges[0]].edge_slope != float('inf'):
-            x1 = x1 + 1 / edges[active_edges[0]].edge_slope
-
-        if edges[active_edges[1]].edge_slope != float('inf'):
-            x2 = x2 + 1 / edges[active_edges[1]].edge_slope
-
-        colorA = interpolate_vectors(edges[active_edges[0]].vertices[0],
-                                     edges[active_edges[0]].vertices[1],
-                                     edges[active_edges[0]].vcolors[0, :],
-                                     edges[active_edges[0]].vcolors[1, :],
-                                     y, 2)
-        colorB = interpolate_vectors(edges[active_edges[1]].vertices[0],
-                                     edges[active_edges[1]].vertices[1],
-                                     edges[active_edges[1]].vcolors[0, :],
-                                     edges[active_edges[1]].vcolors[1, :],
-                                     y, 2)
-
-        normalA = interpolate_vectors(edges[active_edges[0]].vertices[0],
-                                      edges[active_edges[0]].vertices[1],
-                                      edges[active_edges[0]].normals[0, :],
-                                      edges[active_edges[0]].normals[1, :],
-                                      y, 2)
-        normalB = interpolate_vectors(edges[active_edges[1]].vertices[0],
-                                      edges[active_edges[1]].vertices[1],
-                                      edges[active_edges[1]].normals[0, :],
-                                      edges[active_edges[1]].normals[1, :],
-                                      y, 2)
-        for x in range(int(min(x1, x2)), int(max(x1, x2)) + 1):
-            interp_color = interpolate_vectors([x1, y], [x2, y], colorA, colorB, x, 1)
-            interp_normal = interpolate_vectors([x1, y], [x2, y], normalA, normalB, x, 1)
-
-            I = light(bcoords, interp_normal, interp_color, cam_pos, mat, lights, light_amb, lighting).T[0]
-
-            updatedcanvas[y, int(round(x))] = np.clip(I, 0, 1)
-        if y == y_max:
-            break
-
-        active_edges = update_active_edges(edges, active_edges, y)
+        outputs = light_components(bcoords, normals, colors, cam_pos, mat, lights, light_amb, lighting)
+        for output, I in outputs.items():
+            updatedcanvas[output][ys, xs] = canvas_color(np.clip(I, 0, 1), updatedcanvas[output])
 
     return updatedcanvas
@@ -25,6 +25,25 @@ def pin_hole(f, cv, cx, cy, cz, p3d):
     return p2d, depth
 
 
+def camera_axes(cv, ck, cup):
+    # Calculates the unit vectors of the coordinate system of a camera at cv looking at the point ck.
+    # - cv: 3D coordinates of the pinhole camera's center with respect to the WCS' s origin
+    # - ck: 3D coordinates of the target point K of the camera
+    # - cup: the unit up-vector
+    # - cx, cy, cz: the unit vectors x, y, z of the camera
+
+    cz = (cv - ck) / np.linalg.norm(cv - ck)
+    cx = np.cross(cup, cz)
+    cy = np.cross(cz, cx)
+
+    # Normalize cx, cy, and cz
+    cx /= np.linalg.norm(cx)
+    cy /= np.linalg.norm(cy)
+    cz /= np.linalg.norm(cz)
+
+    return cx, cy, cz
+
+
 def camera_looking_at(f, cv, ck, cup, p3d):
 
     # Produces the p2d projection of p3d points using the pin_hole() function, but takes into account the direction the
@@ -38,14 +57,7 @@ def camera_looking_at(f, cv, ck, cup, p3d):
     # - depth: 1*N numpy array with the depth of each point in p3d
 
     # Compute the camera coordinate system
-    cz = (cv - ck) / np.linalg.norm(cv - ck)
-    cx = np.cross(cup, cz)
-    cy = np.cross(cz, cx)
-
-    # Normalize cx, cy, and cz
-    cx /= np.linalg.norm(cx)
-    cy /= np.linalg.norm(cy)
-    cz /= np.linalg.norm(cz)
+    cx, cy, cz = camera_axes(cv, ck, cup)
 
     # Call pin_hole function with the computed camera coordinate system
     p2d, depth = pin_hole(f, cv, cx, cy, cz, p3d)
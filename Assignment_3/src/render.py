@@ -1,6 +1,10 @@
 from gourauds import *
 from projection import *
 from phong import *
+from deferred import *
+from clipping import *
+from bvh import *
+from stats import *
 
 
 def rasterize(p2d, rows, cols, H, W):
@@ -19,16 +23,111 @@ def rasterize(p2d, rows, cols, H, W):
     width = cols / W
     height = rows / H
 
-    # Iterate over each projected 2D coordinate and map it to the corresponding pixel position
-    for i in range(p2d.shape[1]):
-        n2d[i, 0] = np.around((p2d[0, i] + H / 2) * height + 0.5)
-        n2d[i, 1] = np.around((-p2d[1, i] + W / 2) * width + 0.5)
+    # Map all the projected 2D coordinates to their pixel positions at once
+    n2d[:, 0] = np.around((p2d[0] + H / 2) * height + 0.5)
+    n2d[:, 1] = np.around((-p2d[1] + W / 2) * width + 0.5)
 
     return n2d
 
 
+def project_to_pixels(focal, eye, lookat, up, M, N, H, W, verts, out=None, dtype=None):
+    # Fused kernel of camera_looking_at and rasterize: maps the 3D vertices straight to integer pixel coordinates and
+    # depth with whole array operations (view transform, perspective divide, viewport mapping and rounding).
+    # - focal, eye, lookat, up, M, N, H, W, verts: as in render_object
+    # - out: optional preallocated N_v × 2 integer matrix that receives the pixel coordinates
+    # - dtype: the floating point type of the transform (see PRECISIONS), float32 also giving 32-bit pixel indices;
+    # None keeps the type of the camera vectors
+    # - verts2d: N_v × 2 integer matrix with the pixel coordinates of each vertex (out, if given)
+    # - depth: 1 × N_v vector with the depth of each vertex
+
+    # View transform, the same change of coordinate system as in pin_hole
+    cx, cy, cz = camera_axes(eye, lookat, up)
+    R = np.column_stack((cx, cy, cz))
+    if dtype is not None:
+        R = R.astype(dtype)
+    verts_cam = np.dot(R.T, verts - np.dot(R, eye).astype(R.dtype)[:, np.newaxis])
+
+    if out is None:
+        out = np.empty((verts.shape[1], 2), dtype=np.int32 if dtype == np.float32 else int)
+
+    # Perspective divide, then the viewport mapping of rasterize, in place on the projected coordinates
+    p2d = focal * verts_cam[:2]
+    p2d /= verts_cam[2]
+
+    p2d[0] += H / 2
+    p2d[0] *= M / H
+    p2d[0] += 0.5
+
+    np.negative(p2d[1], out=p2d[1])
+    p2d[1] += W / 2
+    p2d[1] *= N / W
+    p2d[1] += 0.5
+
+    np.around(p2d, out=p2d)
+    out[:, 0] = p2d[0]
+    out[:, 1] = p2d[1]
+
+    return out, -verts_cam[2]
+
+
+def project_object(focal, eye, lookat, up, M, N, H, W, verts, faces, dtype=None):
+    # runs the geometry stage of render_object: calculates the normal vectors of the vertices and projects them onto
+    # the pixels of the image (the arguments are those of render_object)
+    # - dtype: the floating point type of the normals and of the projection (see PRECISIONS); None computes the
+    # normals in float64 and keeps the type of the camera vectors for the projection
+    # - normals: 3 × N_v matrix with the normal vector of each vertex
+    # - verts2d: N_v × 2 matrix with the pixel coordinates of each vertex
+    # - depth: 1 × N_v vector with the depth of each vertex
+
+    # Calculate normals for each vertex of each triangle
+    normals = calculate_normals(verts, faces.T, dtype=float if dtype is None else dtype)
+
+    # Project vertices onto the pixels of the image
+    verts2d, depth = project_to_pixels(focal, eye, lookat, up, M, N, H, W, verts, dtype=dtype)
+
+    return normals, verts2d, depth
+
+
+def paint_order(depth, faces, visibility):
+    # decides the order in which the triangles are drawn
+    # - depth: 1 × N_v vector with the depth of each vertex
+    # - faces: N_t × 3 matrix with the indices of the vertices of each triangle
+    # - visibility: string {"painter", "zbuffer"} (see render_object)
+    # - sorted_triangles: the indices of the triangles in drawing order
+
+    # Average depth of every triangle
+    depth_order = np.mean(depth[faces], axis=1)
+
+    if visibility == "painter":
+        # Sort triangles by depth
+        sorted_triangles = np.flip(np.argsort(depth_order))
+    else:
+        # The depth buffer decides the visibility, so the order only matters for how many points get rejected before
+        # they are lit; drawing the nearest triangles first hides the most
+        sorted_triangles = np.argsort(depth_order)
+
+    return sorted_triangles
+
+
+def front_faces(verts, faces, eye):
+    # finds the triangles whose outer side (given by the winding of their vertices) faces the camera; the others are
+    # back faces, hidden behind the front ones on a closed mesh
+    # - verts: 3 × N_v matrix with the coordinates of the vertices of the object
+    # - faces: N_t × 3 matrix with the indices of the vertices of each triangle
+    # - eye: 3 × 1 vector with the coordinates of the centre of the camera
+    # - front: boolean vector with N_t elements, True for the triangles that face the camera
+
+    v1 = verts[:, faces[:, 0]]
+    face_normals = np.cross(verts[:, faces[:, 1]] - v1, verts[:, faces[:, 2]] - v1, axis=0)
+    view = np.reshape(eye, (3, 1)) - v1
+
+    return np.einsum('ij,ij->j', face_normals, view) >= 0
+
+
 def render_object(shader, focal, eye, lookat, up, bg_color, M, N, H, W, verts,
-                  vert_colors, faces, mat, lights, light_amb, lighting):
+                  vert_colors, faces, mat, lights, light_amb, lighting, engine="scanline", visibility="painter",
+                  deferred=False, cache=None, cull=False, clip=False, near=None, far=np.inf, bvh=None,
+                  precision=None, stats=None, vertex_lighting=False):
     # renders an object made of a specific material, placed in a scene with light sources and a camera; calculates how
     # light is reflected onto the object and its final color at each point.
     # - shader: string {"gouraud", "phong"} deciding the coloring function
@@ -49,39 +148,199 @@ def render_object(shader, focal, eye, lookat, up, bg_color, M, N, H, W, verts,
     # mat: object of type PhongMaterial
     # - lights: list of objects of type PointLight
     # - light_amb: 3 × 1 vector with the components of the ambient radiation intensity in the interval [0, 1]
-    # - img: the image with the rendered object
+    # - lighting: string {"ambient", "diffusion", "specular", "full"}, or a collection of them to get the image of every
+    # requested output from a single geometry and rasterization pass (needs the "halfspace" engine or deferred)
+    # - engine: string {"scanline", "halfspace"} deciding whether the triangles are filled by scanning their edges or
+    # by evaluating their edge functions over their bounding boxes as arrays
+    # - visibility: string {"painter", "zbuffer"} deciding whether hidden points are covered by drawing the triangles
+    # from the farthest to the nearest or rejected per pixel with a depth buffer before they are lit
+    # - deferred: if True (only for the "phong" shader), the interpolated normals, colours and depth are first
+    # rasterized into a geometry buffer with a depth test and every visible pixel is then lit once in a single pass;
+    # engine and visibility are then not used
+    # - cache: optional GeometryCache that memoizes the normals, the projection and the drawing order across calls
+    # - cull: if True, the triangles whose outer side faces away from the camera are dropped before shading
+    # - clip: if True, the triangles are clipped against the near and far planes and the ones that lie entirely
+    # outside the image are dropped before shading
+    # - near, far: the depths of the near and far planes (the near plane defaults to the focal distance)
+    # - bvh: optional FaceBVH over faces; its nodes that are outside the image frustum (and, with clip, the near and
+    # far planes, or, with cull, facing away from the camera) are rejected with all their triangles before any
+    # triangle is tested
+    # - precision: string {"double", "single", "half", "compact"} deciding the types of the geometry, the indices
+    # and the image (see PRECISIONS); None keeps the types of the given arrays, computes the normals, the depth buffer
+    # and the G-buffer in float64 and renders onto a float64 image
+    # - stats: optional RenderStats that records the time of every stage ("geometry", "bvh", "cull", "clip", "shading"
+    # or, when deferred, "gbuffer" and "lighting"), the counts of the triangles (submitted, rejected by the bvh, culled
+    # back faces, left after clipping, degenerate), the pixels written and the points lit, and the overdraw of the
+    # image (of the first one, when several lighting outputs are drawn)
+    # - vertex_lighting: if True (only for the "gouraud" shader), every vertex of the drawn triangles is lit once at
+    # its own position before shading and the triangles only interpolate these colors; by default the three vertices
+    # of every triangle are lit at a single point whose coordinates are the means of the x, y and z of each of its
+    # vertices (np.mean(verts[:, indices], axis=0), not the centroid of the triangle), so the two light at different
+    # points and give different images (on h3 about 15k of the 67k drawn pixels differ by more than 0.5)
+    # - img: the image with the rendered object, or a dictionary that maps each requested lighting output to its image
 
     assert shader in ["gouraud", "phong"]
+    assert engine in ["scanline", "halfspace"]
+    assert visibility in ["painter", "zbuffer"]
+    assert not deferred or shader == "phong"
+    assert not vertex_lighting or shader == "gouraud"
+    assert precision is None or precision in PRECISIONS
 
-    # Calculate normals for each vertex of each triangle
-    normals = calculate_normals(verts, faces.T)
+    if not isinstance(lighting, str):
+        lighting = list(lighting)
+        assert engine == "halfspace" or deferred
+
+    # Deferred shading always draws with a depth test
+    if deferred:
+        visibility = "zbuffer"
+
+    # without a precision mode, the projection keeps the types of the camera vectors while the normals, the depth
+    # buffer and the G-buffer are in double precision
+    if precision is None:
+        float_type, buffer_type, canvas_type = None, float, float
+    else:
+        float_type, index_type, canvas_type = PRECISIONS[precision]
+        buffer_type = float_type
+        verts, vert_colors = np.asarray(verts, dtype=float_type), np.asarray(vert_colors, dtype=float_type)
+        faces = np.asarray(faces, dtype=index_type)
+
+    if stats is not None:
+        stats.count("triangles_submitted", len(faces))
+
+    with timed(stats, "geometry"):
+        if cache is None:
+            normals, verts2d, depth = project_object(focal, eye, lookat, up, M, N, H, W, verts, faces, float_type)
+            sorted_triangles = paint_order(depth, faces, visibility)
+        else:
+            normals, verts2d, depth, sorted_triangles = cache.geometry(focal, eye, lookat, up, M, N, H, W, verts,
+                                                                       faces, visibility, float_type)
 
-    # Project vertices onto the camera plane
-    verts_projected, depth = camera_looking_at(focal, eye, lookat, up, verts)
+    if bvh is not None:
+        with timed(stats, "bvh"):
+            # the near and far planes only drop geometry when it is clipped
+            if clip:
+                planes = (focal if near is None else near, far)
+            else:
+                planes = (-np.inf, np.inf)
 
-    # Rasterize the projected vertices
-    verts2d = rasterize(verts_projected, M, N, H, W).astype(int)
+            candidates = np.zeros(len(faces), dtype=bool)
+            candidates[bvh.visible_faces(focal, eye, lookat, up, M, N, H, W, *planes, cull)] = True
+            if stats is not None:
+                stats.count("bvh_rejected", np.count_nonzero(~candidates[sorted_triangles]))
+            sorted_triangles = sorted_triangles[candidates[sorted_triangles]]
 
-    # Initialize image
+    if cull:
+        with timed(stats, "cull"):
+            front = front_faces(verts, faces[sorted_triangles], eye)
+            if stats is not None:
+                stats.count("culled_backfaces", np.count_nonzero(~front))
+            sorted_triangles = sorted_triangles[front]
+
+    if clip:
+        with timed(stats, "clip"):
+            verts, normals, vert_colors, faces = clip_depth(verts, normals, vert_colors, depth,
+                                                            faces[np.sort(sorted_triangles)],
+                                                            focal if near is None else near, far)
+            verts2d, depth = project_to_pixels(focal, eye, lookat, up, M, N, H, W, verts, dtype=float_type)
+            faces = faces[on_screen(verts2d, faces, M, N)]
+            sorted_triangles = paint_order(depth, faces, visibility)
+            if stats is not None:
+                stats.count("triangles_after_clip", len(faces))
+
+    # the triangles with fewer than 3 distinct vertices (including the single pixel ones) draw nothing and are
+    # sorted out at once instead of by each shading function
+    degenerate = degenerate_triangles(verts2d, faces[sorted_triangles])[0]
+    sorted_triangles = sorted_triangles[~degenerate]
+    if stats is not None:
+        stats.count("degenerate_skipped", np.count_nonzero(degenerate))
+
+    if deferred:
+        with timed(stats, "gbuffer"):
+            gbuffer = fill_gbuffer(verts2d, normals, vert_colors, verts, depth, faces, sorted_triangles, M, N,
+                                   buffer_type)
+        with timed(stats, "lighting"):
+            img = shade_gbuffer(gbuffer, bg_color, eye, mat, lights, light_amb, lighting, canvas_type)
+
+        if stats is not None:
+            # every covered pixel of the geometry buffer is lit and written once
+            covered = np.isfinite(gbuffer["depth"])
+            stats.overdraw = covered.astype(np.int64)
+            stats.count("pixels_written", np.count_nonzero(covered))
+            stats.count("light_evaluations", np.count_nonzero(covered))
+        return img
+
+    # Initialize image (one per lighting output)
     image_shape = (M, N, 3)
-    img = np.full(image_shape, bg_color)
+    if isinstance(lighting, str):
+        img = new_canvas(image_shape, bg_color, canvas_type)
+    else:
+        img = {output: new_canvas(image_shape, bg_color, canvas_type) for output in lighting}
 
-    # Average depth of every triangle
-    depth_order = np.mean(depth[faces], axis=1)
+    zbuffer = np.full((M, N), np.inf, dtype=buffer_type) if visibility == "zbuffer" else None
+
+    # Pack the light sources once for the batched lighting of the shading functions
+    packed_lights = pack_lights(lights)
+
+    # Choose the triangle filling function
+    if shader == "gouraud":
+        shade = shade_gouraud if engine == "scanline" else shade_gouraud_halfspace
+    else:
+        shade = shade_phong if engine == "scanline" else shade_phong_halfspace
+
+    if stats is not None:
+        # count the writes to the (first) image
+        if isinstance(lighting, str):
+            img = stats.trace(img)
+        else:
+            img[lighting[0]] = stats.trace(img[lighting[0]])
+
+    lit = 0
+    with timed(stats, "shading"):
+        # the scanning of all the triangles is prepared at once
+        if engine == "scanline":
+            setups = triangle_setup(verts2d[faces[sorted_triangles]])
+        else:
+            setups = [None] * len(sorted_triangles)
+
+        # the vertices shared by several triangles are lit only once
+        vert_lit = None
+        if vertex_lighting:
+            used = np.unique(faces[sorted_triangles])
+            vert_lit = light_vertices(verts, normals, vert_colors, used, eye, mat, packed_lights, light_amb, lighting)
+            lit += len(used)
+
+        for triangle, setup in zip(sorted_triangles, setups):
+            triangle_vertices_indices = faces[triangle]
+            triangle_verts2d = verts2d[triangle_vertices_indices].T
+            triangle_vcolors = vert_colors[triangle_vertices_indices].T
+            bcoords = np.mean(verts[:, triangle_vertices_indices], axis=0).T
+
+            if stats is not None:
+                written = stats.counts["pixels_written"]
+
+            options = {} if setup is None else {"setup": setup}
+            if isinstance(vert_lit, dict):
+                options["lit_colors"] = {output: vert_lit[output][triangle_vertices_indices] for output in lighting}
+            elif vert_lit is not None:
+                options["lit_colors"] = vert_lit[triangle_vertices_indices]
+
+            img = shade(triangle_verts2d, normals[:, triangle_vertices_indices], triangle_vcolors, bcoords, eye, mat,
+                        packed_lights, light_amb, img, lighting, depth[triangle_vertices_indices], zbuffer, **options)
+
+            if stats is not None:
+                # phong lights every written point; gouraud lights the vertices (the halfspace engine only those of
+                # the triangles that cover a pixel)
+                written = stats.counts["pixels_written"] - written
+                if shader == "phong":
+                    lit += written
+                elif vert_lit is None and (engine == "scanline" or written):
+                    lit += 3
+
+    if stats is not None:
+        stats.count("light_evaluations", lit)
+        if isinstance(lighting, str):
+            img = stats.untrace(img)
+        else:
+            img[lighting[0]] = stats.untrace(img[lighting[0]])
 
-    # Sort triangles by depth
-    sorted_triangles = np.flip(np.argsort(depth_order))
-
-    for triangle in sorted_triangles:
-        triangle_vertices_indices = faces[triangle]
-        triangle_verts2d = verts2d[triangle_vertices_indices].T
-        triangle_vcolors = vert_colors[triangle_vertices_indices].T
-        bcoords = np.mean(verts[:, triangle_vertices_indices], axis=0).T
-
-        if shader == "gouraud":
-            img = shade_gouraud(triangle_verts2d, normals[:, triangle_vertices_indices], triangle_vcolors,
-                                bcoords, eye, mat, lights, light_amb, img, lighting)
-        elif shader == "phong":
-            img = shade_phong(triangle_verts2d, normals[:, triangle_vertices_indices], triangle_vcolors,
-                              bcoords, eye, mat, lights, light_amb, img, lighting)
     return img
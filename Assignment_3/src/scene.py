@@ -0,0 +1,83 @@
+import json
+import os
+import sys
+import numpy as np
+
+# A scene is stored as a directory with one .npy file per array and a scene.json header with the scalar values and
+# the list of arrays. The arrays are kept in the layout the renderers index them with, so they are opened with
+# mmap_mode and used without copies: loading is instant whatever their size and the pages of a scene opened by
+# several processes are shared.
+
+HEADER = "scene.json"
+
+# arrays of the original h1/h2/h3 files that are stored transposed, under the name of the renderers' argument
+TRANSPOSED = {"vertex_colors": "vert_colors", "face_indices": "faces"}
+
+
+def scene_layout(data):
+    # converts the contents of an original .npy scene file to the layout of the scene format
+    # - data: dictionary loaded from h1.npy, h2.npy or h3.npy
+    # - scene: dictionary with the scalar values as python numbers and everything else as contiguous numpy arrays
+
+    scene = {}
+    for name, value in data.items():
+        if np.ndim(value) == 0:
+            scene[name] = value.item() if isinstance(value, (np.generic, np.ndarray)) else value
+        elif name in TRANSPOSED:
+            scene[TRANSPOSED[name]] = np.ascontiguousarray(np.asarray(value).T)
+        else:
+            scene[name] = np.ascontiguousarray(value)
+
+    return scene
+
+
+def save_scene(directory, scene):
+    # writes a scene in the scene format
+    # - directory: the directory of the scene (created if it does not exist)
+    # - scene: dictionary with python numbers and numpy arrays, as returned by scene_layout
+
+    os.makedirs(directory, exist_ok=True)
+    header = {"values": {}, "arrays": {}}
+
+    for name, value in scene.items():
+        if isinstance(value, np.ndarray):
+            np.save(os.path.join(directory, name + ".npy"), value)
+            header["arrays"][name] = {"dtype": value.dtype.str, "shape": list(value.shape)}
+        else:
+            header["values"][name] = value
+
+    with open(os.path.join(directory, HEADER), "w") as f:
+        json.dump(header, f, indent=1)
+
+
+def open_scene(path, mmap=True):
+    # opens a scene, either a directory in the scene format or an original .npy file (which is unpickled and
+    # converted to the same layout)
+    # - path: the directory of the scene or the name of the .npy file
+    # - mmap: if True, the arrays of a scene directory are memory mapped read-only instead of read into memory
+    # - scene: dictionary with the values and arrays of the scene
+
+    if not os.path.isdir(path):
+        return scene_layout(np.load(path, allow_pickle=True)[()])
+
+    with open(os.path.join(path, HEADER)) as f:
+        header = json.load(f)
+
+    scene = dict(header["values"])
+    for name in header["arrays"]:
+        scene[name] = np.load(os.path.join(path, name + ".npy"), mmap_mode="r" if mmap else None)
+
+    return scene
+
+
+def convert_scene(npy_path, directory):
+    # converts an original h1/h2/h3 .npy file to a scene directory
+    # - npy_path: the name of the .npy file
+    # - directory: the directory of the new scene
+
+    save_scene(directory, open_scene(npy_path))
+
+
+if __name__ == "__main__":
+    # python scene.py h3.npy h3
+    convert_scene(sys.argv[1], sys.argv[2])
@@ -0,0 +1,152 @@
+from concurrent.futures import ProcessPoolExecutor
+from render import *
+
+
+def bin_triangles(verts2d, faces, triangles, M, N, tile_size):
+    # assigns each triangle to the square screen tiles that its bounding box overlaps
+    # - verts2d: N_v × 2 matrix with the pixel coordinates of each vertex
+    # - faces: N_t × 3 matrix with the indices of the vertices of each triangle
+    # - triangles: indices of the triangles in drawing order
+    # - M, N: height, width of the image in pixels
+    # - tile_size: width and height of a tile in pixels
+    # - bins: dictionary that maps every non-empty tile (tile row, tile column) to the positions in triangles of the
+    # triangles that overlap it, in drawing order
+
+    points = verts2d[faces[triangles]]
+
+    # bounding box of every triangle clipped to the image
+    x_lo = np.clip(points[:, :, 0].min(axis=1), 0, N - 1)
+    x_hi = np.clip(points[:, :, 0].max(axis=1), 0, N - 1)
+    y_lo = np.clip(points[:, :, 1].min(axis=1), 0, M - 1)
+    y_hi = np.clip(points[:, :, 1].max(axis=1), 0, M - 1)
+
+    # triangles that lie entirely outside the image overlap no tile
+    on_screen = (points[:, :, 0].max(axis=1) >= 0) & (points[:, :, 0].min(axis=1) < N) & \
+                (points[:, :, 1].max(axis=1) >= 0) & (points[:, :, 1].min(axis=1) < M)
+    positions = np.flatnonzero(on_screen)
+
+    tx0, tx1 = x_lo[positions] // tile_size, x_hi[positions] // tile_size
+    ty0, ty1 = y_lo[positions] // tile_size, y_hi[positions] // tile_size
+    tiles_x = tx1 - tx0 + 1
+    counts = tiles_x * (ty1 - ty0 + 1)
+
+    # one (triangle, tile) pair for every tile of every bounding box
+    pairs = np.repeat(np.arange(len(positions)), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    tile_row = ty0[pairs] + k // tiles_x[pairs]
+    tile_col = tx0[pairs] + k % tiles_x[pairs]
+
+    # group the pairs by tile, keeping the drawing order inside each tile
+    columns = (N + tile_size - 1) // tile_size
+    tile_ids = tile_row * columns + tile_col
+    order = np.argsort(tile_ids, kind="stable")
+    tile_ids, members = tile_ids[order], positions[pairs[order]]
+    starts = np.flatnonzero(np.r_[True, tile_ids[1:] != tile_ids[:-1]])
+    ends = np.r_[starts[1:], len(tile_ids)]
+
+    bins = {}
+    for start, end in zip(starts, ends):
+        bins[divmod(int(tile_ids[start]), columns)] = members[start:end]
+
+    return bins
+
+
+def render_tile(job):
+    # renders the triangles of a single tile onto a canvas of the tile's size; meant to run in a worker process
+    # - job: dictionary with the tile's origin and shape, its triangles (vertices shifted to the tile's origin) and
+    # the shading parameters, as built by render_object_tiled
+    # - y0, x0: the origin of the tile in the image
+    # - tile: the rendered tile, or a dictionary with one per lighting output
+
+    h, w = job["shape"]
+    if isinstance(job["lighting"], str):
+        tile = new_canvas((h, w, 3), job["bg_color"], job["canvas_type"])
+    else:
+        tile = {output: new_canvas((h, w, 3), job["bg_color"], job["canvas_type"]) for output in job["lighting"]}
+    zbuffer = np.full((h, w), np.inf, dtype=job["buffer_type"]) if job["visibility"] == "zbuffer" else None
+
+    shade = shade_gouraud_halfspace if job["shader"] == "gouraud" else shade_phong_halfspace
+
+    for i in range(len(job["verts_p"])):
+        tile = shade(job["verts_p"][i], job["verts_n"][i], job["verts_c"][i], job["bcoords"][i], job["eye"],
+                     job["mat"], job["lights"], job["light_amb"], tile, job["lighting"], job["vdepth"][i], zbuffer)
+
+    return job["y0"], job["x0"], tile
+
+
+def render_object_tiled(shader, focal, eye, lookat, up, bg_color, M, N, H, W, verts, vert_colors, faces, mat,
+                        lights, light_amb, lighting, visibility="painter", tile_size=64, workers=None, cache=None,
+                        precision=None):
+    # renders the same image as render_object with the halfspace engine, but splits the image into square tiles that
+    # are rendered independently by a pool of worker processes and then stitched together
+    # - shader ... lighting, visibility: as in render_object
+    # - tile_size: width and height of a tile in pixels
+    # - workers: number of worker processes; None uses one per CPU and 1 renders the tiles in this process
+    # - cache: optional GeometryCache, as in render_object
+    # - precision: as in render_object
+    # - img: the image with the rendered object, or a dictionary with one per lighting output
+
+    assert shader in ["gouraud", "phong"]
+    assert visibility in ["painter", "zbuffer"]
+    assert precision is None or precision in PRECISIONS
+
+    if not isinstance(lighting, str):
+        lighting = list(lighting)
+
+    if precision is None:
+        float_type, buffer_type, canvas_type = None, float, float
+    else:
+        float_type, index_type, canvas_type = PRECISIONS[precision]
+        buffer_type = float_type
+        verts, vert_colors = np.asarray(verts, dtype=float_type), np.asarray(vert_colors, dtype=float_type)
+        faces = np.asarray(faces, dtype=index_type)
+
+    if cache is None:
+        normals, verts2d, depth = project_object(focal, eye, lookat, up, M, N, H, W, verts, faces, float_type)
+        sorted_triangles = paint_order(depth, faces, visibility)
+    else:
+        normals, verts2d, depth, sorted_triangles = cache.geometry(focal, eye, lookat, up, M, N, H, W, verts, faces,
+                                                                   visibility, float_type)
+
+    # the triangles with fewer than 3 distinct vertices draw nothing and are not sent to the workers
+    sorted_triangles = sorted_triangles[~degenerate_triangles(verts2d, faces[sorted_triangles])[0]]
+
+    # per triangle data, in drawing order, laid out as the shading functions expect it
+    triangles = faces[sorted_triangles]
+    verts_p = np.transpose(verts2d[triangles], (0, 2, 1))
+    verts_n = np.transpose(normals[:, triangles], (1, 0, 2))
+    verts_c = np.transpose(vert_colors[triangles], (0, 2, 1))
+    bcoords = np.mean(verts[:, triangles], axis=0)
+    vdepth = depth[triangles]
+
+    packed_lights = pack_lights(lights)
+
+    jobs = []
+    for (row, col), members in bin_triangles(verts2d, faces, sorted_triangles, M, N, tile_size).items():
+        y0, x0 = row * tile_size, col * tile_size
+        jobs.append({"y0": y0, "x0": x0, "shape": (min(tile_size, M - y0), min(tile_size, N - x0)),
+                     "verts_p": verts_p[members] - np.array([[x0], [y0]]), "verts_n": verts_n[members],
+                     "verts_c": verts_c[members], "bcoords": bcoords[members], "vdepth": vdepth[members],
+                     "shader": shader, "eye": eye, "mat": mat, "lights": packed_lights, "light_amb": light_amb,
+                     "lighting": lighting, "bg_color": bg_color, "visibility": visibility,
+                     "buffer_type": buffer_type, "canvas_type": canvas_type})
+
+    if isinstance(lighting, str):
+        img = new_canvas((M, N, 3), bg_color, canvas_type)
+    else:
+        img = {output: new_canvas((M, N, 3), bg_color, canvas_type) for output in lighting}
+
+    if workers == 1:
+        tiles = [render_tile(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tiles = list(pool.map(render_tile, jobs))
+
+    for y0, x0, tile in tiles:
+        if isinstance(lighting, str):
+            img[y0:y0 + tile.shape[0], x0:x0 + tile.shape[1]] = tile
+        else:
+            for output in lighting:
+                img[output][y0:y0 + tile[output].shape[0], x0:x0 + tile[output].shape[1]] = tile[output]
+
+    return img
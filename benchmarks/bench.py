@@ -0,0 +1,316 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+import numpy as np
+
+# Times every stage of the three pipelines separately over the bundled scenes (h1, h2, h3) at several resolutions:
+#
+#   python benchmarks/bench.py --output results.json
+#   python benchmarks/bench.py --baseline results.json --threshold 0.1
+#
+# Every stage is run --repeat times after a warm-up run; the report has the median, percentiles and minimum of the
+# wall times and the peak memory traced by tracemalloc during one more, untimed, run (tracing slows the allocations
+# down, so it is kept out of the timings). The modules of the three assignments have the same names, so each
+# assignment is benchmarked by a worker process that runs this file from its src directory.
+# With --baseline the medians are compared to those of a previous report and the stages that got slower by more than
+# the threshold are flagged as regressions (the exit status is then 1). Baselines depend on the machine, so they are
+# not kept in the repository: save one with --output before a change and compare against it after.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENES = {"h1": "Assignment_1", "h2": "Assignment_2", "h3": "Assignment_3"}
+
+PERCENTILES = [10, 50, 90]
+
+
+def fill_triangles(shade, shape, verts2d, vcolors, triangles):
+    # draws the triangles one by one with a triangle filling function of assignments 1 and 2 onto a white canvas
+    # - shade: flats or gourauds
+    # - shape: the shape of the canvas
+    # - verts2d, vcolors: the pixel coordinates and the colors of the vertices
+    # - triangles: list with the vertex indices of each triangle, in drawing order
+
+    canvas = np.ones(shape)
+    for indices in triangles:
+        canvas = shade(canvas, verts2d[indices], vcolors[indices])
+
+    return canvas
+
+
+def stages_h1(scale):
+    # the stages of assignment 1: the depth sort and the filling of the triangles of h1, with their coordinates and
+    # the 512x512 canvas scaled by scale
+    # - scale: the factor of the resolution
+    # - stages: dictionary that maps the name of each stage to a function without arguments that runs it
+
+    from flats import flats, flats_bulk
+    from gourauds import gourauds
+    from scene import open_scene
+
+    data = open_scene("h1.npy", mmap=False)
+    size = int(round(512 * scale))
+    verts2d = np.rint(data['verts2d'] * scale).astype(int)
+    vcolors, faces, depth = data['vcolors'], data['faces'], data['depth']
+
+    def depth_sort():
+        return depth[faces].mean(axis=1).argsort()[::-1]
+
+    order = depth_sort()
+    triangles = [faces[triangle] for triangle in order]
+
+    return {"depth_sort": depth_sort,
+            "flats": lambda: fill_triangles(flats, (size, size, 3), verts2d, vcolors, triangles),
+            "flats_bulk": lambda: flats_bulk(np.ones((size, size, 3)), verts2d, faces, vcolors, order),
+            "gourauds": lambda: fill_triangles(gourauds, (size, size, 3), verts2d, vcolors, triangles)}
+
+
+def stages_h2(scale):
+    # the stages of assignment 2: the projection, the rasterization, the depth sort and the filling of the triangles
+    # of h2, as in the first frame of its demo, with the 512x512 image scaled by scale
+    # - scale, stages: as in stages_h1
+
+    from flats import flats
+    from gourauds import gourauds
+    from projection import camera_looking_at
+    from render import rasterize
+    from scene import open_scene
+
+    data = open_scene("h2.npy", mmap=False)
+    size = int(round(512 * scale))
+    p3d, faces, vcolors = data['verts3d'], data['faces'], data['vcolors']
+    cv, ck, cup = data['c_org'], data['c_lookat'], data['c_up']
+    f, cam_h, cam_w = 70, 15, 15
+
+    p2d, depth = camera_looking_at(f, cv, ck, cup, p3d)
+    verts2d = rasterize(p2d, size, size, cam_h, cam_w).astype(int)
+
+    def depth_sort():
+        return depth[faces].mean(axis=1).argsort()[::-1]
+
+    order = depth_sort()
+    triangles = [faces[triangle] for triangle in order]
+
+    return {"camera_looking_at": lambda: camera_looking_at(f, cv, ck, cup, p3d),
+            "rasterize": lambda: rasterize(p2d, size, size, cam_h, cam_w),
+            "depth_sort": depth_sort,
+            "flats": lambda: fill_triangles(flats, (size, size, 3), verts2d, vcolors, triangles),
+            "gourauds": lambda: fill_triangles(gourauds, (size, size, 3), verts2d, vcolors, triangles)}
+
+
+def stages_h3(scale, light_points=1000):
+    # the stages of assignment 3: the normals, the projection, the rasterization, the depth sort, the shading of the
+    # triangles of h3 with the "full" lighting and the lighting of single points, with the image scaled by scale
+    # - scale, stages: as in stages_h1
+    # - light_points: number of points (vertices of h3) lit one by one with light
+
+    from render import (calculate_normals, camera_looking_at, rasterize, project_to_pixels, paint_order,
+                        shade_gouraud, shade_phong, pack_lights, light, PhongMaterial, PointLight)
+    from scene import open_scene
+
+    data = open_scene("h3.npy", mmap=False)
+    verts, vert_colors, faces = data['verts'], data['vert_colors'], data['faces']
+    focal, eye, lookat, up = data['focal'], data['cam_eye'], data['cam_lookat'], data['cam_up']
+    M, N = int(round(data['M'] * scale)), int(round(data['N'] * scale))
+    H, W = data['H'], data['W']
+    bg_color, light_amb = data['bg_color'].T[0], data['Ia'].T[0]
+    mat = PhongMaterial(data['ka'], data['kd'], data['ks'], data['n'])
+    lights = [PointLight(np.array([position]), np.array([intensity]))
+              for position, intensity in zip(data['light_positions'], data['light_intensities'])]
+
+    normals = calculate_normals(verts, faces.T)
+    p2d, _ = camera_looking_at(focal, eye, lookat, up, verts)
+    verts2d, depth = project_to_pixels(focal, eye, lookat, up, M, N, H, W, verts)
+    sorted_triangles = paint_order(depth, faces, "painter")
+    packed_lights = pack_lights(lights)
+
+    def shade_all(shade):
+        # the triangle loop of render_object
+        img = np.full((M, N, 3), bg_color, dtype=float)
+        for triangle in sorted_triangles:
+            indices = faces[triangle]
+            img = shade(verts2d[indices].T, normals[:, indices], vert_colors[indices].T,
+                        np.mean(verts[:, indices], axis=0).T, eye, mat, packed_lights, light_amb, img, "full",
+                        depth[indices], None)
+        return img
+
+    points = np.linspace(0, verts.shape[1] - 1, light_points).astype(int)
+
+    def light_all():
+        return [light(verts[:, i], normals[:, i], vert_colors[i], eye, mat, lights, light_amb, "full")
+                for i in points]
+
+    return {"calculate_normals": lambda: calculate_normals(verts, faces.T),
+            "camera_looking_at": lambda: camera_looking_at(focal, eye, lookat, up, verts),
+            "rasterize": lambda: rasterize(p2d, M, N, H, W),
+            "depth_sort": lambda: paint_order(depth, faces, "painter"),
+            "shade_gouraud": lambda: shade_all(shade_gouraud),
+            "shade_phong": lambda: shade_all(shade_phong),
+            "light": light_all}
+
+
+def measure(stage, repeat):
+    # times a stage and traces its peak memory
+    # - stage: function without arguments
+    # - repeat: number of timed runs
+    # - result: dictionary with the times in seconds, their statistics and the peak memory in bytes
+
+    stage()
+
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        stage()
+        times.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    stage()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {"times": times, "min": min(times), "peak_bytes": peak}
+    for q, value in zip(PERCENTILES, np.percentile(times, PERCENTILES)):
+        result["p%d" % q] = float(value)
+    result["median"] = result["p50"]
+
+    return result
+
+
+def run_worker(scene, scales, stages, repeat):
+    # benchmarks the stages of one scene in this process (its src directory must be the working directory)
+    # - scene: "h1", "h2" or "h3"
+    # - scales: list of resolution factors
+    # - stages: the names of the stages to run, or None for all of them
+    # - results: list with a dictionary per stage and scale
+
+    sys.path.insert(0, os.getcwd())
+
+    # the filling functions warn about every degenerate triangle of the scenes
+    warnings.simplefilter("ignore")
+    make_stages = {"h1": stages_h1, "h2": stages_h2, "h3": stages_h3}[scene]
+
+    results = []
+    for scale in scales:
+        for name, stage in make_stages(scale).items():
+            if stages is None or name in stages:
+                result = {"scene": scene, "stage": name, "scale": scale}
+                result.update(measure(stage, repeat))
+                results.append(result)
+
+    return results
+
+
+def run(scenes, scales, stages, repeat, log=None):
+    # benchmarks the scenes, each one in a worker process started from its src directory
+    # - scenes, scales, stages, repeat: as in run_worker
+    # - log: optional function called with a line of progress after every scene
+    # - report: dictionary with the machine and the settings ("meta") and the list of results
+
+    results = []
+    for scene in scenes:
+        command = [sys.executable, os.path.abspath(__file__), "--worker", scene, "--scales", ",".join(map(str, scales)),
+                   "--repeat", str(repeat)]
+        if stages is not None:
+            command += ["--stages", ",".join(stages)]
+
+        output = subprocess.run(command, cwd=os.path.join(ROOT, SCENES[scene], "src"), check=True,
+                                stdout=subprocess.PIPE).stdout
+        scene_results = json.loads(output)
+        results += scene_results
+
+        if log is not None:
+            log("%s: %d stage(s) done" % (scene, len(scene_results)))
+
+    meta = {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+            "processor": platform.processor(), "system": platform.system(), "repeat": repeat, "scales": scales}
+
+    return {"meta": meta, "results": results}
+
+
+def compare(report, baseline, threshold):
+    # compares the median times of a report with those of a baseline report
+    # - report, baseline: reports of run
+    # - threshold: the relative slowdown above which a stage is flagged (0.1 for 10%)
+    # - rows: list of (scene, stage, scale, baseline median, median, ratio, regression) for the stages in both reports
+
+    previous = {(r["scene"], r["stage"], r["scale"]): r["median"] for r in baseline["results"]}
+
+    rows = []
+    for r in report["results"]:
+        key = (r["scene"], r["stage"], r["scale"])
+        if key in previous:
+            ratio = r["median"] / previous[key] if previous[key] > 0 else float("inf")
+            rows.append(key + (previous[key], r["median"], ratio, ratio > 1 + threshold))
+
+    return rows
+
+
+def format_report(report):
+    # formats the results of a report as a table
+    lines = ["%-6s %-18s %6s %10s %10s %10s %10s %12s" % ("scene", "stage", "scale", "min", "p10", "median", "p90",
+                                                        "peak (KiB)")]
+    for r in report["results"]:
+        lines.append("%-6s %-18s %6g %10.4f %10.4f %10.4f %10.4f %12.1f" % (
+            r["scene"], r["stage"], r["scale"], r["min"], r["p10"], r["median"], r["p90"], r["peak_bytes"] / 1024))
+
+    return "\n".join(lines)
+
+
+def format_comparison(rows):
+    # formats the rows of compare as a table
+    lines = ["%-6s %-18s %6s %12s %10s %8s" % ("scene", "stage", "scale", "baseline", "median", "ratio")]
+    for scene, stage, scale, previous, median, ratio, regression in rows:
+        lines.append("%-6s %-18s %6g %12.4f %10.4f %8.2f%s" % (scene, stage, scale, previous, median, ratio,
+                                                                 "  REGRESSION" if regression else ""))
+
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Times every stage of the pipelines over the bundled scenes.")
+    parser.add_argument("--scenes", default="h1,h2,h3", help="comma separated scenes (default: h1,h2,h3)")
+    parser.add_argument("--scales", default="0.5,1", help="comma separated resolution factors (default: 0.5,1)")
+    parser.add_argument("--stages", default=None, help="comma separated stages to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs of every stage (default: 5)")
+    parser.add_argument("--output", default=None, help="write the report as JSON to this file")
+    parser.add_argument("--baseline", default=None, help="compare the medians with this report")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown flagged as a regression (default: 0.1)")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    scales = [float(scale) for scale in args.scales.split(",")]
+    stages = None if args.stages is None else args.stages.split(",")
+
+    if args.worker is not None:
+        json.dump(run_worker(args.worker, scales, stages, args.repeat), sys.stdout)
+        return 0
+
+    scenes = args.scenes.split(",")
+    assert set(scenes) <= set(SCENES)
+
+    report = run(scenes, scales, stages, args.repeat, log=lambda line: print(line, file=sys.stderr))
+    print(format_report(report))
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            rows = compare(report, json.load(f), args.threshold)
+        print()
+        print(format_comparison(rows))
+        if any(row[-1] for row in rows):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())